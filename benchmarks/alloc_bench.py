@@ -0,0 +1,76 @@
+# Allocation traffic of the conversion path, with and without a FramePool.
+# Python side: tracemalloc peak per frame. PIL side: image memory blocks malloc'ed vs reused
+# from the block cache (Image.core.get_stats(), PIL image memory is invisible to tracemalloc).
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.alloc_bench --width 1920 --height 1080 --hd 720p --frames 30
+import argparse
+import ctypes
+import tracemalloc
+from time import perf_counter
+
+from PIL import Image
+
+from ..encoder import _sample_frame
+from ..pool import FramePool
+from ..record import raw_to_memory
+
+
+def capture_copy(mapped, pool):
+    # what dxgi.get_dxgi_output_duplication_frame does with the mapped surface
+    size = len(mapped)
+    pointer = ctypes.addressof(mapped)
+    if pool is None:
+        return ctypes.string_at(pointer, size)
+    frame = pool.buffer(size)
+    ctypes.memmove((ctypes.c_char * size).from_buffer(frame), pointer, size)
+    return frame
+
+
+def run(mapped, args, pool):
+    payloads = list()
+    raw_to_memory(capture_copy(mapped, pool), args.width, args.height, hd=args.hd, memory=True, pool=pool)  # warm up
+
+    before = Image.core.get_stats()
+    tracemalloc.start()
+    peaks = list()
+    start = perf_counter()
+    for _ in range(args.frames):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        frame = capture_copy(mapped, pool)
+        payloads.append(raw_to_memory(frame, args.width, args.height, hd=args.hd, quality=args.quality,
+                                      memory=True, pool=pool))
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    elapsed = perf_counter() - start
+    tracemalloc.stop()
+    after = Image.core.get_stats()
+
+    return {
+        "peak": max(peaks),
+        "new_blocks": (after["allocated_blocks"] - before["allocated_blocks"]) / args.frames,
+        "reused_blocks": (after["reused_blocks"] - before["reused_blocks"]) / args.frames,
+        "ms": elapsed / args.frames * 1000,
+    }
+
+
+def main(args):
+    raw = _sample_frame(args.width, args.height)
+    mapped = (ctypes.c_char * len(raw)).from_buffer_copy(raw)  # stands in for the mapped GPU surface
+
+    print("%dx%d -> %s, quality %d, %d frames" % (args.width, args.height, args.hd, args.quality, args.frames))
+    print("%-8s %14s %16s %16s %10s" % ("", "py peak/frame", "PIL mallocs/frame", "PIL reused/frame", "ms/frame"))
+    for name, make_pool in (("no pool", None), ("pool", FramePool)):
+        # FramePool enables PIL's block cache, so it is only created after the baseline run
+        result = run(mapped, args, make_pool() if make_pool else None)
+        print("%-8s %11.1f MB %16.2f %16.2f %10.1f" % (
+            name, result["peak"] / 2 ** 20, result["new_blocks"], result["reused_blocks"], result["ms"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--hd", default="720p")
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--frames", type=int, default=30)
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+# Cost of the dedup.FrameFilter signature per frame, compared with encoding the frame, and the
+# decisions it takes on a synthetic sequence: caret blink (near duplicate), small edit, scene change.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.dedup_bench --width 1920 --height 1080 --rounds 200
+import argparse
+from time import perf_counter
+
+import numpy
+
+from ..dedup import FrameFilter
+from ..encoder import _sample_frame, raw_to_image
+from ..record import raw_to_memory
+
+
+def timed(function, rounds):
+    times = list()
+    for _ in range(rounds):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+
+def frames(width, height):
+    # (name, raw BGRA frame) sequence
+    base = _sample_frame(width, height)
+    frame = numpy.frombuffer(base, numpy.uint8).reshape(height, width, 4)
+
+    caret = frame.copy()
+    caret[500:520, 700:702, :3] = 0  # 2 x 20 px text cursor
+
+    edit = frame.copy()
+    edit[500:520, 700:900, :3] = 0  # a typed word
+
+    scene = 255 - frame
+    scene[:, :, 3] = 255
+    return [("first", base), ("caret on", caret.tobytes()), ("caret off", base), ("edit", edit.tobytes()),
+            ("same", edit.tobytes()), ("scene change", scene.tobytes())]
+
+
+def main(args):
+    width, height = args.width, args.height
+    raw = _sample_frame(width, height)
+    image = raw_to_image(raw, width, height)
+    dedup = FrameFilter(threshold=args.threshold, scene_threshold=args.scene_threshold)
+
+    print("%dx%d, signature grid %dx%d, step %d, median of %d rounds" % (
+        width, height, dedup.grid[0], dedup.grid[1], dedup.step, args.rounds))
+    signature = dedup.signature_raw(raw, width, height)
+    dedup.check(signature)  # reference for the comparisons below
+    for name, function in (
+            ("signature_raw (BGRA)", lambda: dedup.signature_raw(raw, width, height)),
+            ("signature_image (PIL)", lambda: dedup.signature_image(image)),
+            ("check", lambda: dedup.check(signature)),
+            ("encode 1080p q75", lambda: raw_to_memory(raw, width, height, quality=75))):
+        print("%-24s %8.3f ms" % (name, timed(function, args.rounds if "encode" not in name else 10)))
+
+    print()
+    print("%-14s %6s %7s %10s %10s" % ("frame", "emit", "scene", "max diff", "mean diff"))
+    dedup = FrameFilter(threshold=args.threshold, scene_threshold=args.scene_threshold)
+    for name, frame in frames(width, height):
+        emit, scene_change = dedup.check(dedup.signature_raw(frame, width, height))
+        print("%-14s %6s %7s %10.2f %10.2f" % (name, emit, scene_change, *dedup.difference))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--threshold", type=float, default=3.0)
+    parser.add_argument("--scene-threshold", type=float, default=40.0)
+    parser.add_argument("--rounds", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+# FrameIndex lookups per second while a capture thread keeps adding frames.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.index_bench --size 180 --readers 4 --fps 60 --duration 5
+import argparse
+import random
+import threading
+from time import perf_counter, sleep
+
+from ..frame import FrameIndex, FrameRecord
+
+
+def writer(index, fps, stop):
+    seq = 0
+    frame_time = 1 / fps
+    payload = b"x" * 1024
+    while not stop.is_set():
+        index.add(FrameRecord(seq, perf_counter(), payload))
+        seq += 1
+        sleep(frame_time)
+
+
+def reader(index, window, counts, slot, stop):
+    lookups = 0
+    while not stop.is_set():
+        now = perf_counter()
+        kind = lookups % 3
+        if kind == 0:
+            t1 = now - random.random() * window
+            index.frames_between(t1, t1 + window / 10)
+        elif kind == 1:
+            index.nearest(now - random.random() * window)
+        else:
+            index.latest()
+        lookups += 1
+    counts[slot] = lookups
+
+
+def main(args):
+    index = FrameIndex(args.size)
+    stop = threading.Event()
+    window = args.size / args.fps  # seconds covered by the buffer
+
+    threading.Thread(target=writer, args=(index, args.fps, stop), daemon=True).start()
+    sleep(min(window, 2))  # fill the buffer
+
+    counts = [0] * args.readers
+    threads = [threading.Thread(target=reader, args=(index, window, counts, i, stop)) for i in range(args.readers)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    print("size %d, %d readers, writer at %d fps" % (args.size, args.readers, args.fps))
+    print("lookups/s  %.0f total, %.0f per reader" % (sum(counts) / elapsed, sum(counts) / elapsed / args.readers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=180)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--duration", type=float, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+# Disk throughput of recording frames: one file per JPEG (open / write / close per frame) vs
+# sink.SegmentWriter (segment files, coalesced writes on a writer thread), and the time the
+# capture thread spends handing frames over.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.sink_bench --directory /tmp/sink_bench --frames 1000 --size 150000
+import argparse
+import os
+import shutil
+from time import perf_counter
+
+from ..frame import FrameRecord
+from ..sink import SegmentWriter, read_frame, read_index
+
+
+def per_file(directory, payloads):
+    start = perf_counter()
+    for seq, payload in enumerate(payloads):
+        with open(os.path.join(directory, "%06d.jpg" % seq), "wb") as file:
+            file.write(payload)
+    return perf_counter() - start, 0.0
+
+
+def segments(directory, payloads, args):
+    writer = SegmentWriter(directory, segment_bytes=args.segment_mb * 2 ** 20)
+    start = perf_counter()
+    handover = 0.0
+    for seq, payload in enumerate(payloads):
+        put_start = perf_counter()
+        writer.put(FrameRecord(seq, perf_counter(), payload))
+        handover += perf_counter() - put_start
+    writer.close()
+    elapsed = perf_counter() - start
+
+    # random access through the index
+    stats = writer.stats()
+    entry = read_index(writer.segments[-1][:-4] + ".idx")[-1]
+    assert read_frame(writer.segments[-1], entry[2], entry[3]) == payloads[entry[0]]
+    print("segments: %d, writes: %d, dropped: %d, capture thread blocked %.1f ms" % (
+        stats["segments"], stats["writes"], stats["dropped"], stats["blocked_time"] * 1000))
+    return elapsed, handover
+
+
+def main(args):
+    payloads = [os.urandom(args.size) for _ in range(args.frames)]
+    total = args.frames * args.size / 2 ** 20
+
+    print("%d frames of %d bytes (%.0f MB) in %s" % (args.frames, args.size, total, args.directory))
+    print("%-16s %10s %10s %18s" % ("", "MB/s", "frames/s", "handover us/frame"))
+    for name, run in (("file per frame", lambda d: per_file(d, payloads)),
+                      ("segment writer", lambda d: segments(d, payloads, args))):
+        directory = os.path.join(args.directory, name.replace(" ", "_"))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        elapsed, handover = run(directory)
+        print("%-16s %10.1f %10.1f %18.1f" % (name, total / elapsed, args.frames / elapsed,
+                                              handover / args.frames * 1e6))
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", default="sink_bench")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=150000, help="bytes per frame")
+    parser.add_argument("--segment-mb", type=int, default=64)
+    main(parser.parse_args())
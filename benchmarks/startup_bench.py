@@ -0,0 +1,84 @@
+# Startup latency: import time of record.py in fresh interpreters (and which slow modules it pulls in)
+# and time to first frame of a recorder (constructor returns, display ready, first buffered frame).
+# Exits with status 1 when the median import time is above --max-import-ms, for use as a regression check.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.startup_bench --runs 10 --max-import-ms 150
+import argparse
+import os
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+PACKAGE = __package__.rpartition(".")[0]
+SLOW_MODULES = ("numpy", "comtypes", "PIL.ImageGrab", PACKAGE + ".src.dxgi", PACKAGE + ".src.xshm",
+                PACKAGE + ".dedup", PACKAGE + ".yuv")
+
+IMPORT = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import %s.record
+print(perf_counter() - start)
+print(" ".join(m for m in %r if m in sys.modules))
+""" % (PACKAGE, SLOW_MODULES)
+
+
+def import_time(runs):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times, loaded = list(), ""
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT], env=env, check=True, capture_output=True,
+                                text=True).stdout.splitlines()
+        times.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else ""
+    times.sort()
+    return times[len(times) // 2], loaded
+
+
+def first_frame(timeout):
+    from .. import record
+
+    start = perf_counter()
+    if sys.platform == "win32":
+        rec = record.ScreenRecordDupAPI()
+    else:
+        rec = record.DirectScreenRecord()
+    constructed = perf_counter() - start
+
+    rec.capture(fps=30)
+    ready = rec.ready().result(timeout) if hasattr(rec, "ready") else None
+    ready_time = perf_counter() - start if ready is not None else constructed
+    while rec.latest() is None and perf_counter() - start < timeout:
+        sleep(0.001)
+    first = perf_counter() - start if rec.latest() is not None else None
+    rec.stop()
+    return constructed, ready_time, first
+
+
+def main(args):
+    median, loaded = import_time(args.runs)
+    print("import %s.record: %.1f ms (median of %d fresh interpreters)" % (PACKAGE, median * 1000, args.runs))
+    print("slow modules loaded at import: %s" % (loaded or "none"))
+
+    if not args.no_capture:
+        try:
+            constructed, ready, first = first_frame(args.timeout)
+        except Exception as e:  # no display to capture here
+            print("time to first frame: skipped (%s: %s)" % (e.__class__.__name__, e))
+        else:
+            print("recorder constructed: %.1f ms, display ready: %.1f ms, first frame: %s" % (
+                constructed * 1000, ready * 1000, "%.1f ms" % (first * 1000) if first else "timed out"))
+
+    if args.max_import_ms and median * 1000 > args.max_import_ms:
+        print("import time above %.0f ms" % args.max_import_ms)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--no-capture", action="store_true", help="import time only")
+    main(parser.parse_args())
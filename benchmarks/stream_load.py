@@ -0,0 +1,149 @@
+# Load test for stream.StreamServer on loopback.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.stream_load --clients 300 --slow 30 --fps 30 --duration 10
+import argparse
+import asyncio
+import os
+import threading
+from time import perf_counter, sleep
+
+from ..frame import FrameRecord
+from ..stream import StreamServer
+
+
+class FakeRecorder:
+    # stands in for ScreenRecordDupAPI / DirectScreenRecord, publishes a fixed payload at fps
+    def __init__(self, fps, size):
+        self.memory = True
+        self.fps = fps
+        self.payload = os.urandom(size)
+        self.publish_times = list()
+        self._subscribers = list()
+        self._is_capturing = False
+
+    def subscribe(self, callback):
+        self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        self._subscribers = [c for c in self._subscribers if c is not callback]
+
+    def capture(self):
+        self._is_capturing = True
+        threading.Thread(target=self._capture, daemon=True).start()
+
+    def _capture(self):
+        frame_time = 1 / self.fps
+        while self._is_capturing:
+            start = perf_counter()
+            record = FrameRecord(len(self.publish_times), start, bytes(self.payload))  # new payload, like an encode
+            for callback in self._subscribers:
+                callback(record)
+            self.publish_times.append(perf_counter() - start)
+
+            frame_time_left = frame_time - (perf_counter() - start)
+            if frame_time_left > 0:
+                sleep(frame_time_left)
+
+    def stop(self):
+        self._is_capturing = False
+
+
+async def client(port, received, delay, websocket):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if websocket:
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    else:
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await reader.readuntil(b"\r\n\r\n")
+
+    index = len(received)
+    received.append(0)
+    try:
+        while True:
+            if websocket:
+                head = await reader.readexactly(2)
+                size = head[1] & 0x7F
+                if size == 126:
+                    size = int.from_bytes(await reader.readexactly(2), "big")
+                elif size == 127:
+                    size = int.from_bytes(await reader.readexactly(8), "big")
+                await reader.readexactly(size)
+            else:
+                head = await reader.readuntil(b"\r\n\r\n")
+                size = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+                await reader.readexactly(size + 2)
+
+            received[index] += 1
+            if delay:
+                await asyncio.sleep(delay)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def run_server(server, loop, started):
+    loop.run_until_complete(server.start())
+    started.set()
+    loop.run_forever()
+    loop.run_until_complete(server.stop())
+    loop.close()
+
+
+async def main(args):
+    recorder = FakeRecorder(args.fps, args.size)
+    server = StreamServer(recorder, port=0, queue_size=args.queue_size, drop=args.drop)
+
+    loop = asyncio.new_event_loop()  # server runs on its own loop and thread, like in a real process
+    started = threading.Event()
+    thread = threading.Thread(target=run_server, args=(server, loop, started), daemon=True)
+    thread.start()
+    started.wait()
+
+    fast, slow = list(), list()
+    tasks = list()
+    for i in range(args.clients):
+        is_slow = i < args.slow
+        delay = 2.0 / args.fps if is_slow else 0
+        tasks.append(asyncio.ensure_future(
+            client(server.port, slow if is_slow else fast, delay, websocket=(i % 2 == 1 and args.websocket))))
+
+    await asyncio.sleep(0.5)  # let everyone connect
+    recorder.capture()
+    start = perf_counter()
+    await asyncio.sleep(args.duration)
+    recorder.stop()
+    elapsed = perf_counter() - start
+
+    loop.call_soon_threadsafe(loop.stop)
+    latency = server.stats()["latency"]
+    await asyncio.get_running_loop().run_in_executor(None, thread.join)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    publish = sorted(recorder.publish_times)
+    print("clients          %d (%d slow)" % (args.clients, len(slow)))
+    print("frames produced  %d (%.1f fps)" % (len(publish), len(publish) / elapsed))
+    if fast:
+        print("fast client fps  min %.1f avg %.1f" % (min(fast) / elapsed, sum(fast) / len(fast) / elapsed))
+    if slow:
+        print("slow client fps  min %.1f avg %.1f" % (min(slow) / elapsed, sum(slow) / len(slow) / elapsed))
+    print("publish cost     p50 %.1f us, max %.1f us" % (publish[len(publish) // 2] * 1e6, publish[-1] * 1e6))
+    if latency[50] is not None:
+        print("capture to send  p50 %.1f ms, p90 %.1f ms, p99 %.1f ms" % (
+            latency[50] * 1000, latency[90] * 1000, latency[99] * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--slow", type=int, default=30, help="clients that read at half the frame rate")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--size", type=int, default=100000, help="payload bytes per frame")
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--drop", default="oldest")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--websocket", action="store_true", help="connect every other client over WebSocket")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,52 @@
+# Per frame latency of raw_to_memory, whole frame vs striped bands.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.stripe_bench --width 3840 --height 2160 --hd 1080p --bands 1 2 4 8
+import argparse
+from io import BytesIO
+from time import perf_counter
+
+from PIL import Image
+
+from ..encoder import _sample_frame
+from ..record import raw_to_memory
+from ..stripe import StripedEncoder
+from ..yuv import psnr
+
+
+def timed(fn, rounds):
+    result = fn()
+    start = perf_counter()
+    for _ in range(rounds):
+        fn()
+    return result, (perf_counter() - start) / rounds * 1000
+
+
+def main(args):
+    raw = _sample_frame(args.width, args.height)
+    print("%dx%d -> %s, quality %d" % (args.width, args.height, args.hd, args.quality))
+
+    whole, whole_time = timed(lambda: raw_to_memory(raw, args.width, args.height, hd=args.hd, quality=args.quality,
+                                                    memory=True), args.rounds)
+    reference = Image.open(BytesIO(whole))
+    print("whole frame   %7.1f ms" % whole_time)
+
+    for bands in args.bands:
+        stripes = StripedEncoder(bands=bands, workers=args.workers)
+        striped, striped_time = timed(lambda: raw_to_memory(raw, args.width, args.height, hd=args.hd,
+                                                            quality=args.quality, memory=True, stripes=stripes),
+                                      args.rounds)
+        stripes.close()
+        print("%2d bands      %7.1f ms  psnr vs whole frame %.1f dB" % (
+            bands, striped_time, psnr(Image.open(BytesIO(striped)), reference)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--hd", default="1080p")
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--bands", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,54 @@
+# X11 capture throughput, MIT-SHM (src/xshm.py) vs ImageGrab, grab only and grab + encode, and a
+# check that both backends capture the same pixels. Runs against any X server, e.g. a local Xvfb:
+#   xvfb-run -s "-screen 0 1920x1080x24" python -m capture.benchmarks.x11_bench --frames 100
+# Run from the directory containing the capture package.
+import argparse
+from time import perf_counter
+
+from PIL import ImageChops, ImageGrab
+
+from ..encoder import raw_to_image
+from ..pool import FramePool
+from ..record import pil_to_memory, raw_to_memory
+from ..src import xshm
+
+
+def rate(function, frames):
+    function()  # warm up
+    start = perf_counter()
+    for _ in range(frames):
+        function()
+    elapsed = perf_counter() - start
+    return frames / elapsed, elapsed / frames * 1000
+
+
+def main(args):
+    capture = xshm.XShmCapture(args.display)
+    width, height = capture.width, capture.height
+    pool = FramePool()
+    grab = ImageGrab.grab if not args.display else lambda: ImageGrab.grab(xdisplay=args.display)
+
+    # both backends see the same screen
+    difference = ImageChops.difference(raw_to_image(capture.grab(), width, height), grab().convert("RGB"))
+    print("%dx%d, pixels identical: %s" % (width, height, difference.getbbox() is None))
+
+    print("%-28s %10s %10s" % ("", "fps", "ms/frame"))
+    for name, function in (
+            ("ImageGrab grab", grab),
+            ("MIT-SHM grab", lambda: capture.grab(buffer=pool.buffer)),
+            ("ImageGrab grab + %s" % args.hd, lambda: pil_to_memory(grab(), width, height, hd=args.hd,
+                                                                     quality=args.quality, pool=pool)),
+            ("MIT-SHM grab + %s" % args.hd, lambda: raw_to_memory(capture.grab(buffer=pool.buffer), width, height,
+                                                                   hd=args.hd, quality=args.quality, memory=True,
+                                                                   pool=pool))):
+        print("%-28s %10.1f %10.2f" % ((name,) + rate(function, args.frames)))
+    capture.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--display", default=None, help="X display, $DISPLAY by default")
+    parser.add_argument("--hd", default="720p")
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--frames", type=int, default=100)
+    main(parser.parse_args())
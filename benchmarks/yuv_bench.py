@@ -0,0 +1,83 @@
+# Direct BGRA -> YUV 4:2:0 path against the RGB path of raw_to_memory.
+# Times both paths per resolution and checks the YUV output is within a PSNR tolerance.
+# Run from the directory containing the capture package:
+#   python -m capture.benchmarks.yuv_bench --width 1920 --height 1080 --quality 75
+import argparse
+import sys
+from io import BytesIO
+from time import perf_counter
+
+from PIL import Image
+
+from .. import yuv
+from ..encoder import PIL_JPEG, _sample_frame, available_encoders, raw_to_image
+from ..record import RESOLUTIONS
+
+
+def timed(fn, rounds):
+    fn()
+    start = perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (perf_counter() - start) / rounds * 1000
+
+
+def validation_frame(width, height):
+    # _sample_frame plus solid saturated patches (BGRA): blue, red and white, pure primaries hit
+    # the extremes of Cb / Cr where the fixed point conversion must clip instead of wrapping
+    image = Image.frombytes("RGBA", (width, height), _sample_frame(width, height))
+    patch_width, top, bottom = width // 8, height // 2, height // 2 + height // 4
+    for index, colour in enumerate(((255, 0, 0, 255), (0, 0, 255, 255), (255, 255, 255, 255))):
+        left = width // 2 + index * patch_width
+        image.paste(colour, (left, top, left + patch_width, bottom))
+    return image.tobytes()
+
+
+def main(args):
+    encoders = [cls() for cls in available_encoders("jpeg") if cls.accepts_yuv]
+    encoder = encoders[0] if encoders else PIL_JPEG  # PIL takes YCbCr without colour conversion
+    print("encoder %r, %dx%d, quality %d, tolerance %.1f dB" % (
+        encoder, args.width, args.height, args.quality, args.tolerance))
+
+    raw = validation_frame(args.width, args.height)
+    reference = raw_to_image(raw, args.width, args.height)
+    failed = False
+
+    for hd in ["1080p"] + list(RESOLUTIONS):
+        size = RESOLUTIONS.get(hd)
+        exact = reference.resize(size, Image.ANTIALIAS) if size else reference
+
+        def rgb_path():
+            image = Image.frombytes("RGBA", (args.width, args.height), raw)
+            b, g, r, _ = image.split()
+            image = Image.merge("RGB", (r, g, b))
+            if size:
+                image = image.resize(size, Image.ANTIALIAS)
+            return encoder.encode(image, args.quality)
+
+        def yuv_path():
+            y, u, v = yuv.bgra_to_yuv420(raw, args.width, args.height, size=size)
+            return encoder.encode_yuv(y, u, v, args.quality)
+
+        rgb, rgb_time = timed(rgb_path, args.rounds)
+        direct, yuv_time = timed(yuv_path, args.rounds)
+
+        rgb_psnr = yuv.psnr(Image.open(BytesIO(rgb)), exact)
+        yuv_psnr = yuv.psnr(Image.open(BytesIO(direct)), exact)
+        ok = yuv_psnr >= rgb_psnr - args.tolerance
+        failed = failed or not ok
+
+        print("%-6s rgb %7.1f ms  yuv %7.1f ms  psnr rgb %5.1f dB yuv %5.1f dB  %s" % (
+            hd, rgb_time, yuv_time, rgb_psnr, yuv_psnr, "ok" if ok else "FAIL"))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed PSNR loss against the RGB path (dB)")
+    sys.exit(main(parser.parse_args()))
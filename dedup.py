@@ -0,0 +1,76 @@
+import numpy
+
+from .encoder import raw_to_array
+
+
+__all__ = ["FrameFilter"]
+
+
+class FrameFilter:
+    # Pre-encode near duplicate and scene change detection. Each frame is reduced to a tiny
+    # luma signature (grid of cell means of the green channel, sampled every `step` pixels)
+    # and compared with the signature of the last emitted frame:
+    #   largest cell difference < threshold        near duplicate (anti-aliasing flicker, caret
+    #                                              blink, ...), not encoded
+    #   mean cell difference >= scene_threshold    scene change, FrameRecord.scene_change is set
+    #                                              so consumers can start a new keyframe / segment
+    # Differences are in 8 bit luma levels. Not thread safe, one filter per capture thread.
+    def __init__(self, threshold=3.0, scene_threshold=40.0, grid=(32, 18), step=2):
+        self.threshold = threshold
+        self.scene_threshold = scene_threshold
+        self.grid = grid
+        self.step = step
+        self.reference = None  # signature of the last emitted frame
+        self.difference = (0.0, 0.0)  # (largest, mean) cell difference of the last checked frame
+        self.skipped = 0
+        self.scene_changes = 0
+
+    def signature(self, plane):
+        # uint8 2D plane -> (rows, columns) float32 cell means, strided views, no copy of the plane.
+        # Frames (regions) smaller than the grid get one cell per sampled pixel
+        plane = plane[::self.step, ::self.step]
+        if not plane.size:
+            raise ValueError("empty frame")
+        columns, rows = min(self.grid[0], plane.shape[1]), min(self.grid[1], plane.shape[0])
+        cell_height, cell_width = plane.shape[0] // rows, plane.shape[1] // columns
+
+        cells = plane[:rows * cell_height, :columns * cell_width].reshape(rows, cell_height, columns, cell_width)
+        sums = cells.sum(axis=(1, 3), dtype=numpy.uint32)
+        return sums.astype(numpy.float32) / (cell_height * cell_width)
+
+    def signature_raw(self, raw_bytes, width, height, region=None):
+        # signature of a captured BGRA frame
+        frame = raw_to_array(raw_bytes, width, height)  # row padding skipped
+        if region:
+            frame = frame[region[1]:region[3], region[0]:region[2]]
+        return self.signature(frame[:, :, 1])
+
+    def signature_image(self, image, region=None):
+        # signature of an RGB PIL image
+        plane = numpy.asarray(image.getchannel(1))
+        if region:
+            plane = plane[region[1]:region[3], region[0]:region[2]]
+        return self.signature(plane)
+
+    def check(self, signature):
+        # (emit, scene_change) for a frame, an emitted frame becomes the new reference
+        if self.reference is None:
+            self.reference = signature
+            self.difference = (255.0, 255.0)
+            self.scene_changes += 1
+            return True, True
+
+        delta = numpy.abs(signature - self.reference)
+        self.difference = largest, mean = float(delta.max()), float(delta.mean())
+        if largest < self.threshold:
+            self.skipped += 1
+            return False, False
+
+        self.reference = signature
+        scene_change = mean >= self.scene_threshold
+        if scene_change:
+            self.scene_changes += 1
+        return True, scene_change
+
+    def reset(self):
+        self.reference = None
@@ -0,0 +1,251 @@
+import importlib
+from io import BytesIO
+from time import perf_counter
+
+from PIL import Image, features
+
+
+__all__ = ["Encoder", "PILJPEGEncoder", "TurboJPEGEncoder", "SimpleJPEGEncoder", "WebPEncoder", "PNGEncoder",
+           "ENCODERS", "available_encoders", "get_encoder", "select_encoder"]
+
+
+_modules = dict()
+
+
+def _optional(name):
+    # optional bindings are imported on first use, not with this module (numpy alone adds
+    # ~70 ms to the import), None when not installed:
+    #   numpy, turbojpeg (PyTurboJPEG, libjpeg-turbo SIMD bindings),
+    #   simplejpeg (libjpeg-turbo SIMD bindings, bundled library), lz4.block (storage.FrameStore)
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
+
+
+def frame_pitch(raw_bytes, height):
+    # bytes per row of a captured frame, DXGI pads rows beyond width * 4 at some sizes (e.g. 1366x768)
+    return len(raw_bytes) // height
+
+
+def raw_to_image(raw_bytes, width, height):
+    # captured frames are BGRA (X is unused), decode straight to RGB without split/merge
+    return Image.frombuffer("RGB", (width, height), raw_bytes, "raw", "BGRX", frame_pitch(raw_bytes, height), 1)
+
+
+def raw_to_array(raw_bytes, width, height):
+    # zero copy (height, width, 4) view of a BGRA frame, row padding is skipped by the strides
+    numpy = _optional("numpy")
+    pitch = frame_pitch(raw_bytes, height)
+    return numpy.frombuffer(raw_bytes, numpy.uint8, pitch * height).reshape(height, pitch // 4, 4)[:, :width]
+
+
+class Encoder:
+    # Base encoder. encode() takes a PIL RGB image, encode_raw() a BGRA frame as captured and
+    # encode_yuv() planar YUV 4:2:0 (see yuv.bgra_to_yuv420). pool is an optional pool.FramePool
+    # whose buffers PIL based encoders reuse.
+    # Encoders that set accepts_raw / accepts_yuv encode those inputs natively without a PIL image.
+    # All encoders of the same format produce interchangeable bytes (baseline JPEG 4:2:0, WebP, PNG).
+    name = None
+    format = None
+    accepts_raw = False
+    accepts_yuv = False
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def encode(self, image, quality=75, pool=None):
+        raise NotImplementedError
+
+    def encode_raw(self, raw_bytes, width, height, quality=75, pool=None):
+        if pool is not None:
+            return self.encode(pool.raw_to_image(raw_bytes, width, height), quality, pool)
+        return self.encode(raw_to_image(raw_bytes, width, height), quality)
+
+    def encode_yuv(self, y, u, v, quality=75):
+        from .yuv import yuv420_to_image
+        return self.encode(yuv420_to_image(y, u, v).convert("RGB"), quality)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.format)
+
+
+class PILJPEGEncoder(Encoder):
+    name = "pil"
+    format = "jpeg"
+
+    def encode(self, image, quality=75, pool=None):
+        if pool is not None:
+            return pool.save(image, "jpeg", quality=quality)
+        mem = BytesIO()
+        image.save(mem, "jpeg", quality=quality)
+        return mem.getvalue()
+
+    def encode_yuv(self, y, u, v, quality=75):
+        # libjpeg takes YCbCr as is, no colour conversion
+        from .yuv import yuv420_to_image
+        return self.encode(yuv420_to_image(y, u, v), quality)
+
+
+class TurboJPEGEncoder(Encoder):
+    name = "turbojpeg"
+    format = "jpeg"
+    accepts_raw = True
+    accepts_yuv = True
+
+    def __init__(self):
+        self.turbojpeg = _optional("turbojpeg")
+        self.numpy = _optional("numpy")
+        self.jpeg = self.turbojpeg.TurboJPEG()
+
+    @classmethod
+    def available(cls):
+        turbojpeg = _optional("turbojpeg")
+        if turbojpeg is None or _optional("numpy") is None:
+            return False
+        try:
+            turbojpeg.TurboJPEG()  # raises if the shared library is missing
+        except (OSError, RuntimeError):
+            return False
+        return True
+
+    def encode(self, image, quality=75, pool=None):
+        turbojpeg = self.turbojpeg
+        return self.jpeg.encode(self.numpy.asarray(image), quality=quality, pixel_format=turbojpeg.TJPF_RGB,
+                                jpeg_subsample=turbojpeg.TJSAMP_420)
+
+    def encode_raw(self, raw_bytes, width, height, quality=75, pool=None):
+        turbojpeg = self.turbojpeg
+        return self.jpeg.encode(raw_to_array(raw_bytes, width, height), quality=quality,
+                                pixel_format=turbojpeg.TJPF_BGRA, jpeg_subsample=turbojpeg.TJSAMP_420)
+
+    def encode_yuv(self, y, u, v, quality=75):
+        planar = self.numpy.concatenate((y.ravel(), u.ravel(), v.ravel()))  # I420 buffer
+        return self.jpeg.encode_from_yuv(planar, y.shape[0], y.shape[1], quality=quality,
+                                         jpeg_subsample=self.turbojpeg.TJSAMP_420)
+
+
+class SimpleJPEGEncoder(Encoder):
+    name = "simplejpeg"
+    format = "jpeg"
+    accepts_raw = True
+    accepts_yuv = True
+
+    def __init__(self):
+        self.simplejpeg = _optional("simplejpeg")
+        self.numpy = _optional("numpy")
+
+    @classmethod
+    def available(cls):
+        return _optional("simplejpeg") is not None and _optional("numpy") is not None
+
+    def encode(self, image, quality=75, pool=None):
+        return self.simplejpeg.encode_jpeg(self.numpy.asarray(image), quality=quality, colorspace="RGB",
+                                           colorsubsampling="420")
+
+    def encode_raw(self, raw_bytes, width, height, quality=75, pool=None):
+        return self.simplejpeg.encode_jpeg(raw_to_array(raw_bytes, width, height), quality=quality,
+                                           colorspace="BGRA", colorsubsampling="420")
+
+    def encode_yuv(self, y, u, v, quality=75):
+        return self.simplejpeg.encode_jpeg_yuv_planes(y, u, v, quality=quality)
+
+
+class WebPEncoder(Encoder):
+    name = "webp"
+    format = "webp"
+
+    @classmethod
+    def available(cls):
+        return features.check("webp")
+
+    def encode(self, image, quality=75, pool=None):
+        if pool is not None:
+            return pool.save(image, "webp", quality=quality, method=0)
+        mem = BytesIO()
+        image.save(mem, "webp", quality=quality, method=0)  # method 0 is the fastest
+        return mem.getvalue()
+
+
+class PNGEncoder(Encoder):
+    name = "png"
+    format = "png"
+
+    def encode(self, image, quality=75, pool=None):
+        # lossless, quality is ignored
+        if pool is not None:
+            return pool.save(image, "png", compress_level=1)
+        mem = BytesIO()
+        image.save(mem, "png", compress_level=1)
+        return mem.getvalue()
+
+
+ENCODERS = {cls.name: cls for cls in (PILJPEGEncoder, TurboJPEGEncoder, SimpleJPEGEncoder, WebPEncoder, PNGEncoder)}
+
+_selected = dict()  # (format, width, height, quality) -> fastest encoder
+
+
+def available_encoders(format=None):
+    return [cls for cls in ENCODERS.values() if (format is None or cls.format == format) and cls.available()]
+
+
+def _sample_frame(width, height):
+    # desktop like content: flat areas, gradients and some noise
+    row = bytes((x * 255 // max(width - 1, 1)) for x in range(width))
+    gradient = Image.frombytes("L", (width, 1), row).resize((width, height))
+    noise = Image.effect_noise((width, height), 64)
+    image = Image.merge("RGBA", (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT), noise))
+    image.paste((240, 240, 240, 255), (0, 0, width // 2, height // 2))
+    r, g, b, a = image.split()
+    return Image.merge("RGBA", (b, g, r, a)).tobytes()  # BGRA, as captured
+
+
+def select_encoder(width, height, quality=75, format="jpeg", rounds=5):
+    # startup micro benchmark, picks the fastest available encoder of `format` for this
+    # resolution and quality. The result is cached for the process.
+    key = (format, width, height, quality)
+    if key in _selected:
+        return _selected[key]
+
+    candidates = [cls() for cls in available_encoders(format)]
+    if not candidates:
+        raise ValueError("no encoder available for format %r" % format)
+
+    frame = _sample_frame(width, height)
+    best, best_time = candidates[0], None
+    if len(candidates) > 1:
+        for encoder in candidates:
+            encoder.encode_raw(frame, width, height, quality)  # warm up
+            start = perf_counter()
+            for _ in range(rounds):
+                encoder.encode_raw(frame, width, height, quality)
+            elapsed = perf_counter() - start
+
+            if best_time is None or elapsed < best_time:
+                best, best_time = encoder, elapsed
+
+    _selected[key] = best
+    return best
+
+
+def get_encoder(encoder=None, width=None, height=None, quality=75):
+    # encoder: None (PIL JPEG), an Encoder instance, an encoder name from ENCODERS,
+    # or "auto" / "auto:<format>" to benchmark the available backends for width x height
+    if encoder is None:
+        return PIL_JPEG
+    if isinstance(encoder, Encoder):
+        return encoder
+    if encoder.startswith("auto"):
+        format = encoder.partition(":")[2] or "jpeg"
+        return select_encoder(width, height, quality, format=format)
+    if encoder not in ENCODERS:
+        raise ValueError("unknown encoder %r" % encoder)
+    if not ENCODERS[encoder].available():
+        raise ValueError("encoder %r is not available, install its bindings" % encoder)
+    return ENCODERS[encoder]()
+
+
+PIL_JPEG = PILJPEGEncoder()
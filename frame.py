@@ -0,0 +1,139 @@
+import threading
+from bisect import bisect_left, bisect_right
+from time import perf_counter
+
+
+__all__ = ["FrameRecord", "FrameIndex", "rendition_id", "latency_percentiles", "nearest_rank"]
+
+
+class FrameRecord:
+    # One buffered frame. payload is the encoded bytes (or PIL image when memory=False) and is
+    # referenced, never copied, so the same payload can be shared by many records / consumers.
+    #   seq                 monotonic sequence number per recorder, gaps mean dropped frames
+    #   timestamp           capture time in seconds, time.perf_counter() clock (LastPresentTime on DXGI)
+    #   accumulated_frames  desktop updates folded into this frame, 0 for a repeated frame
+    #   encode_time         seconds spent converting / encoding this frame
+    #   rendition           rendition id, see rendition_id()
+    #   scene_change        the content changed a lot since the previous frame (dedup.FrameFilter),
+    #                       a good place for a keyframe / new segment
+    __slots__ = ("seq", "timestamp", "accumulated_frames", "encode_time", "rendition", "scene_change", "payload")
+
+    def __init__(self, seq, timestamp, payload, accumulated_frames=1, encode_time=0.0, rendition=None,
+                 scene_change=False):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.payload = payload
+        self.accumulated_frames = accumulated_frames
+        self.encode_time = encode_time
+        self.rendition = rendition
+        self.scene_change = scene_change
+
+    def view(self):
+        # zero copy memoryview of an encoded payload
+        return memoryview(self.payload)
+
+    def __len__(self):
+        return len(self.payload) if isinstance(self.payload, (bytes, bytearray, memoryview)) else 0
+
+    def __repr__(self):
+        return "<FrameRecord seq=%d t=%.6f acc=%d enc=%.1fms %s%s %d bytes>" % (
+            self.seq, self.timestamp, self.accumulated_frames, self.encode_time * 1000, self.rendition,
+            " scene" if self.scene_change else "", len(self))
+
+
+class FrameIndex:
+    # Timestamp / sequence index over the last `size` captured frames, kept next to the
+    # recorder's frame_buffer. Frames popped from the buffer stay referenced until evicted here,
+    # size is the recorder's index_size. Lookups never remove anything, so many
+    # readers can query it while the capture thread adds frames. The lock is only held for a
+    # bisect and a slice, O(log n) per lookup.
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._times = list()  # sorted timestamps, entries before _start are evicted
+        self._records = list()  # records in the same order, None before _start
+        self._by_seq = dict()
+        self._start = 0
+
+    def add(self, record):
+        with self._lock:
+            times, records = self._times, self._records
+            if len(times) > self._start and record.timestamp < times[-1]:
+                # out of order timestamp (clock source changed), keep the list sorted
+                position = bisect_right(times, record.timestamp, self._start)
+                times.insert(position, record.timestamp)
+                records.insert(position, record)
+            else:
+                times.append(record.timestamp)
+                records.append(record)
+            self._by_seq[record.seq] = record
+
+            if len(times) - self._start > self.size:
+                del self._by_seq[records[self._start].seq]
+                records[self._start] = None  # drop the payload now, not at the next compaction
+                self._start += 1
+                if self._start >= self.size:
+                    # compact once per `size` evictions instead of shifting the lists every frame
+                    del times[:self._start]
+                    del records[:self._start]
+                    self._start = 0
+
+    def __len__(self):
+        return len(self._times) - self._start
+
+    def frames_between(self, t1, t2):
+        # records with t1 <= timestamp <= t2, oldest first
+        with self._lock:
+            first = bisect_left(self._times, t1, self._start)
+            last = bisect_right(self._times, t2, self._start)
+            return self._records[first:last]
+
+    def nearest(self, t):
+        # record with the timestamp closest to t, None when empty
+        with self._lock:
+            times, start = self._times, self._start
+            position = bisect_left(times, t, start)
+            if position == len(times):
+                position -= 1
+            elif position > start and t - times[position - 1] <= times[position] - t:
+                position -= 1
+            return self._records[position] if position >= start else None
+
+    def latest(self):
+        with self._lock:
+            return self._records[-1] if len(self._records) > self._start else None
+
+    def get(self, seq):
+        # record by sequence number, None when evicted
+        return self._by_seq.get(seq)
+
+    def clear(self):
+        with self._lock:
+            del self._times[:]
+            del self._records[:]
+            self._by_seq.clear()
+            self._start = 0
+
+
+def rendition_id(hd, quality, encoder, region=None):
+    # e.g. "720p-q75.jpeg" or "720p-q75-0_0_1280_720.jpeg" for a region, frames with the same id
+    # are interchangeable
+    if region:
+        return "%s-q%d-%s.%s" % (hd, quality, "_".join(str(int(v)) for v in region), encoder.format)
+    return "%s-q%d.%s" % (hd, quality, encoder.format)
+
+
+def latency_percentiles(records, now=None, percentiles=(50, 90, 99)):
+    # capture to now latency (seconds) percentiles of records, call it right after sending them
+    if now is None:
+        now = perf_counter()
+
+    latencies = sorted(now - record.timestamp for record in records)
+    return nearest_rank(latencies, percentiles)
+
+
+def nearest_rank(values, percentiles):
+    # nearest rank percentiles of sorted values
+    if not values:
+        return {p: None for p in percentiles}
+    return {p: values[min(len(values) - 1, int(len(values) * p / 100))] for p in percentiles}
@@ -0,0 +1,193 @@
+import collections
+import threading
+from time import perf_counter, sleep
+
+from PIL import Image
+
+from .encoder import get_encoder
+from .frame import FrameIndex, FrameRecord, rendition_id
+from .pool import FramePool
+from .record import RESOLUTIONS, Display, output_size
+
+
+__all__ = ["CaptureHub", "HubSubscription"]
+
+
+class HubSubscription:
+    # One consumer of a CaptureHub with its own region, resolution, quality and fps.
+    # Exposes the same buffer API as the recorders (get_frame_buffer, get_frame_record,
+    # frames_between, subscribe ...) so it can be used in their place, e.g. by stream.StreamServer.
+    def __init__(self, hub, region, hd, quality, fps, memory, encoder, frame_buffer_size, index_size=None):
+        self.hub = hub
+        self.region = region
+        self.hd = hd
+        self.quality = quality
+        self.fps = fps
+        self.memory = memory
+        self.encoder = encoder
+        self.size = RESOLUTIONS.get(hd)
+        self.rendition = rendition_id(hd, quality, encoder, region)
+        self.frame_buffer_size = frame_buffer_size
+        self.frame_buffer = collections.deque(list(), frame_buffer_size)
+        if index_size is None:
+            index_size = frame_buffer_size if memory else 1  # see record.ScreenRecordDupAPI
+        self.frame_index = FrameIndex(index_size)
+        self.frame_sequence = 0
+        self._next_frame = None  # master clock time this subscription takes its next frame
+        self._dirty = False  # the desktop changed since the last frame this subscription took
+        self._subscribers = list()
+
+    def get_frame_buffer(self, timestamp=False):
+        record = self.frame_buffer.popleft()
+        return (record.timestamp, record.payload) if timestamp else record.payload
+
+    def get_frame_record(self):
+        return self.frame_buffer.popleft()
+
+    def frames_between(self, t1, t2):
+        return self.frame_index.frames_between(t1, t2)
+
+    def nearest(self, t):
+        return self.frame_index.nearest(t)
+
+    def latest(self):
+        return self.frame_index.latest()
+
+    def subscribe(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers = [c for c in self._subscribers if c is not callback]
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def _due(self, now):
+        # decimation of the master clock, True when this subscription takes the current frame
+        if self._next_frame is None:
+            self._next_frame = now  # first tick
+        if now < self._next_frame:
+            return False
+        self._next_frame = max(self._next_frame + 1 / self.fps, now)
+        return True
+
+    def _buffer(self, payload, frame_time, accumulated_frames=1, encode_time=0.0):
+        record = FrameRecord(self.frame_sequence, frame_time, payload, accumulated_frames, encode_time,
+                             self.rendition)
+        self.frame_sequence += 1
+        self.frame_buffer.append(record)
+        self.frame_index.add(record)
+        for callback in self._subscribers:
+            callback(record)
+
+
+class CaptureHub:
+    # Capture once, subscribe many: a single desktop duplication and acquisition loop feeding
+    # any number of subscriptions. The loop runs at the highest subscribed fps, each frame is
+    # converted BGRA -> RGB once, every distinct (region, resolution) is cropped / resized once
+    # and every distinct (region, resolution, quality, encoder) is encoded once, then shared
+    # by all subscriptions asking for it. A desktop update is kept (as the converted image) until
+    # every subscription has taken it, slower subscriptions get it on their next due tick.
+    def __init__(self, display=None):
+        self.display = display or Display()
+        self.width = self.display.width
+        self.height = self.display.height
+        self.subscriptions = list()
+        self.pool = FramePool()
+        self._latest = None  # (image, present time, accumulated frames) of the last desktop update
+        self._is_capturing = False
+
+    def subscribe(self, region=None, hd="1080p", quality=75, fps=15, memory=True, encoder=None,
+                  frame_buffer_size=180, index_size=None):
+        encoder = get_encoder(encoder, *output_size(self.width, self.height, region, hd), quality=quality)
+        subscription = HubSubscription(self, region, hd, quality, fps, memory, encoder, frame_buffer_size,
+                                       index_size)
+        subscription._dirty = self._latest is not None  # starts with the current desktop
+        self.subscriptions = self.subscriptions + [subscription]  # copy on write, capture thread iterates
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+
+    def capture(self):
+        if self._is_capturing:
+            return False
+
+        self._is_capturing = True
+        threading.Thread(target=self._capture).start()
+        return True
+
+    def stop(self):
+        if not self._is_capturing:
+            return False
+
+        self._is_capturing = False
+        return True
+
+    def _capture(self):
+        pool = self.pool
+
+        while self._is_capturing:
+            start = perf_counter()
+            subscriptions = self.subscriptions
+            if not subscriptions:
+                sleep(0.05)
+                continue
+            frame_time = 1 / max(s.fps for s in subscriptions)  # master clock
+
+            frame = self.display.desktop_dup_api(pool=pool)
+            now = perf_counter()
+            if frame is not None:
+                # one colour conversion for everyone, the pooled image stays valid until the next update
+                image = pool.raw_to_image(frame, self.width, self.height)
+                self._latest = (image, self.display.last_present_time, self.display.accumulated_frames)
+                for subscription in subscriptions:
+                    subscription._dirty = True
+            due = [s for s in subscriptions if s._due(now)]
+
+            updated = [s for s in due if s._dirty]
+            for subscription in due:
+                if not subscription._dirty and len(subscription.frame_buffer):
+                    # nothing changed on the desktop since its last frame, repeat the newest frame
+                    subscription._buffer(subscription.frame_buffer[-1].payload, now, 0)
+            if updated:
+                self._distribute(*self._latest, updated)
+
+            frame_time_left = frame_time - (perf_counter() - start)
+            if frame_time_left > 0:
+                sleep(frame_time_left)
+
+        self._is_capturing = False
+
+    def _distribute(self, image, frame_time, accumulated_frames, subscriptions):
+        convert_start = perf_counter()
+        images = dict()  # (region, size) -> image
+        payloads = dict()  # (region, size, quality, encoder name, format, memory) -> (payload, encode time)
+
+        for subscription in subscriptions:
+            key = (subscription.region, subscription.size)
+            shared = images.get(key)
+            if shared is None:
+                shared = image
+                region = subscription.region
+                if region and (region[2] - region[0] != self.width or region[3] - region[1] != self.height):
+                    shared = shared.crop(region)
+                if subscription.size:
+                    shared = shared.resize(subscription.size, Image.ANTIALIAS)
+                images[key] = shared
+
+            # by encoder name, get_encoder() returns a new instance for every subscription of webp / png
+            encoder = subscription.encoder
+            payload_key = key + (subscription.quality, encoder.name, encoder.format, subscription.memory)
+            if payload_key not in payloads:
+                if subscription.memory:
+                    payload = encoder.encode(shared, subscription.quality)
+                else:
+                    payload = shared.copy() if shared is image else shared  # the pooled image is reused
+                payloads[payload_key] = (payload, perf_counter() - convert_start)
+
+            payload, encode_time = payloads[payload_key]
+            subscription._dirty = False
+            subscription._buffer(payload, frame_time, accumulated_frames, encode_time)
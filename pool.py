@@ -0,0 +1,53 @@
+from io import BytesIO
+
+from PIL import Image
+
+from .encoder import frame_pitch
+
+
+__all__ = ["FramePool"]
+
+
+class FramePool:
+    # Recycled buffers for the conversion path of one capture thread (not thread safe).
+    # raw frames are copied into one preallocated bytearray, decoded BGRA -> RGB into one
+    # preallocated image and encoded into one reused BytesIO, all sized for the active
+    # resolution and reallocated only when it changes. Temporary images (crop / resize)
+    # come from PIL's block cache instead of fresh mallocs.
+    def __init__(self, cached_blocks=16):
+        self.images = dict()  # (mode, size) -> Image
+        self.buffers = dict()  # size -> bytearray
+        self.output = BytesIO()
+
+        if Image.core.get_blocks_max() < cached_blocks:
+            Image.core.set_blocks_max(cached_blocks)
+
+    def image(self, mode, size):
+        key = (mode, size)
+        image = self.images.get(key)
+        if image is None:
+            self.images.clear()  # resolution changed
+            image = self.images[key] = Image.new(mode, size)
+        return image
+
+    def buffer(self, size):
+        buffer = self.buffers.get(size)
+        if buffer is None:
+            self.buffers.clear()
+            buffer = self.buffers[size] = bytearray(size)
+        return buffer
+
+    def raw_to_image(self, raw_bytes, width, height):
+        # decode into the pooled image, valid until the next call. Rows can be padded (DXGI pitch)
+        image = self.image("RGB", (width, height))
+        image.frombytes(raw_bytes, "raw", "BGRX", frame_pitch(raw_bytes, height))
+        return image
+
+    def save(self, image, format, **params):
+        # encode into the reused BytesIO, only the returned payload is a new allocation
+        mem = self.output
+        mem.seek(0)
+        image.save(mem, format, **params)
+        size = mem.tell()
+        with mem.getbuffer() as view:
+            return bytes(view[:size])
@@ -1,24 +1,85 @@
 import threading
 import collections
-from PIL import ImageGrab, Image
-from io import BytesIO
-from time import time, sleep
+import importlib
+import zlib
+from concurrent.futures import Future
+from PIL import Image
+from time import time, sleep, perf_counter
 
-
-try:
-    from .src import dxgi
-except ImportError:
-    pass
+from .encoder import PIL_JPEG, get_encoder, raw_to_image
+from .frame import FrameIndex, FrameRecord, rendition_id
+from .pool import FramePool
+from .storage import CompressedFrame, FrameStore
+from .stripe import StripedEncoder
 
 
 __all__ = ["ScreenRecordDupAPI", "DirectScreenRecord"]  # Import functions
 
 
-def raw_to_memory(raw_bytes, width, height, region=None, hd="1080p", quality=75, memory=False):
+_backends = dict()
+
+
+def _backend(name):
+    # Capture backends are imported on first use, not with this module (see benchmarks/startup_bench.py):
+    # .src.dxgi loads comtypes and defines the COM interfaces, .src.xshm loads libX11, .yuv needs numpy
+    # and PIL.ImageGrab its platform backend. None when the module cannot be loaded on this system.
+    if name not in _backends:
+        try:
+            _backends[name] = importlib.import_module(name, __package__)
+        except (ImportError, OSError):
+            _backends[name] = None
+    return _backends[name]
+
+
+RESOLUTIONS = {
+    # hd = full means 1920*1080p which is 1080p, frames are not resized
+    "720p": (1280, 720),  # HD, do not lower quality less than 40%, can go upto 30% for avg quality
+    "480p": (854, 480),  # medium, do not lower than 80%
+    "360p": (640, 360),  # set max quality
+    "240p": (426, 240),
+    "144p": (256, 144),
+}
+
+
+def output_size(width, height, region=None, hd="1080p"):
+    # size of the frames stored in the buffer
+    if hd in RESOLUTIONS:
+        return RESOLUTIONS[hd]
+    if region:
+        return region[2] - region[0], region[3] - region[1]
+    return width, height
+
+
+def raw_to_memory(raw_bytes, width, height, region=None, hd="1080p", quality=75, memory=False, encoder=None,
+                  pool=None, stripes=None):
     # hd = full means 1920*1080p which is 1080p
-    image = Image.frombytes("RGBA", (width, height), raw_bytes)
-    b, g, r, _ = image.split()
-    image = Image.merge("RGB", (r, g, b))
+    # pool: FramePool of the calling capture thread, reuses the conversion buffers between frames
+    # stripes: StripedEncoder, converts and encodes horizontal bands of the frame in parallel (4K frames)
+    encoder = encoder or PIL_JPEG
+
+    if memory and stripes is not None:
+        return stripes.encode(raw_bytes, width, height, region=region, size=RESOLUTIONS.get(hd), quality=quality,
+                              encoder=encoder)
+
+    if memory and encoder.accepts_raw and hd not in RESOLUTIONS and (
+            not region or (region[2] - region[0] == width and region[3] - region[1] == height)):
+        # encoder takes the captured BGRA frame as is, no PIL image needed
+        return encoder.encode_raw(raw_bytes, width, height, quality, pool)
+
+    yuv = _backend(".yuv") if memory and encoder.accepts_yuv else None
+    if yuv is not None and yuv.reduce_factor(*output_size(width, height, region), RESOLUTIONS.get(hd)) > 1:
+        # BGRA straight to planar YUV 4:2:0 with crop and downscale in the same pass,
+        # no RGB image and no colour conversion inside the encoder. Only pays off when the
+        # pass also shrinks the frame (see benchmarks/yuv_bench.py)
+        y, u, v = yuv.bgra_to_yuv420(raw_bytes, width, height, size=RESOLUTIONS.get(hd), region=region)
+        return encoder.encode_yuv(y, u, v, quality)
+
+    # BGRA decoded straight to RGB, no split / merge
+    if pool is not None:
+        image = pool.raw_to_image(raw_bytes, width, height)
+    else:
+        image = raw_to_image(raw_bytes, width, height)
+    pooled = pool is not None
 
     # Trim pitch padding
     # image = image.crop((0, 0, width, height))
@@ -27,83 +88,103 @@ def raw_to_memory(raw_bytes, width, height, region=None, hd="1080p", quality=75,
     if region:
         if region[2] - region[0] != width or region[3] - region[1] != height:
             image = image.crop(region)
+            pooled = False
 
-    if hd == "720p":
-        # 720p
-        # Do not lower quality less than 40% for 720p, can go upto 30% for avg quality
-        image = image.resize((1280, 720), Image.ANTIALIAS)  # HD
-
-    if hd == "480p":
-        # 480p, do not lower than 80%
-        image = image.resize((854, 480), Image.ANTIALIAS)  # medium
-
-    if hd == "360p":
-        # 360p, set max quality
-        image = image.resize((640, 360), Image.ANTIALIAS)  # medium
-
-    if hd == "240p":
-        # 360p, set max quality
-        image = image.resize((426, 240), Image.ANTIALIAS)  # medium
-
-    if hd == "144p":
-        # 360p, set max quality
-        image = image.resize((256, 144), Image.ANTIALIAS)  # medium
+    if hd in RESOLUTIONS:
+        image = image.resize(RESOLUTIONS[hd], Image.ANTIALIAS)
+        pooled = False
 
     if memory:
         # save in memory
-        mem = BytesIO()
-        image.save(mem, "jpeg", quality=quality)
         # For full HD, quality can be set till 20%. In worst case it can go till 10% and still looks good.
         # for 720p, do not less quality than 25%
-        return mem.getvalue()
+        return encoder.encode(image, quality, pool)
 
-    # return PIL image
-    return image
+    # return PIL image, the pooled image is overwritten by the next frame
+    return image.copy() if pooled else image
 
 
-def pil_to_memory(image, width, height, region=None, hd="1080p", quality=75):
+def pil_to_memory(image, width, height, region=None, hd="1080p", quality=75, encoder=None, pool=None):
     # Region slicing
     if region:
         if region[2] - region[0] != width or region[3] - region[1] != height:
             image = image.crop(region)
 
-    if hd == "720p":
-        # 720p
-        # Do not lower quality less than 40% for 720p, can go upto 30% for avg quality
-        image = image.resize((1280, 720), Image.ANTIALIAS)  # HD
+    if hd in RESOLUTIONS:
+        image = image.resize(RESOLUTIONS[hd], Image.ANTIALIAS)
 
-    if hd == "480p":
-        # 480p, do not lower than 80%
-        image = image.resize((854, 480), Image.ANTIALIAS)  # medium
+    # save in memory
+    # For full HD, quality can be set till 20%. In worst case it can go till 10% and still looks good.
+    # for 720p, do not less quality than 25%
+    return (encoder or PIL_JPEG).encode(image, quality, pool)
 
-    if hd == "360p":
-        # 360p, set max quality
-        image = image.resize((640, 360), Image.ANTIALIAS)  # medium
 
-    if hd == "240p":
-        # 360p, set max quality
-        image = image.resize((426, 240), Image.ANTIALIAS)  # medium
+def frame_signature(image):
+    # cheap change detection, 16x16 box averaged thumbnail (a caret blink still changes it)
+    return image.reduce(16).tobytes()
 
-    if hd == "144p":
-        # 360p, set max quality
-        image = image.resize((256, 144), Image.ANTIALIAS)  # medium
 
-    # save in memory
-    mem = BytesIO()
-    image.save(mem, "jpeg", quality=quality)
-    # For full HD, quality can be set till 20%. In worst case it can go till 10% and still looks good.
-    # for 720p, do not less quality than 25%
-    return mem.getvalue()
+def raw_signature(raw_bytes):
+    # exact change detection of a raw frame without decoding it
+    return zlib.crc32(raw_bytes)
+
+
+def _join(thread):
+    # wait for the thread of a stopped capture run (not when called from that thread, e.g. a subscriber)
+    if thread is not None and thread is not threading.current_thread():
+        thread.join()
 
 
 class Display:
+    # Primary output of the desktop duplication API. Device discovery runs on a background thread so
+    # constructing a Display returns at once, ready() is a Future that resolves to the Display (or
+    # raises) once discovery is done. width / height and desktop_dup_api() wait for it.
+    # The D3D / DXGI objects are free threaded, they are created on the discovery thread and used
+    # on the capture thread.
     def __init__(self):
         self.primary = None
 
+        self.dxgi = None  # src.dxgi, imported by the discovery thread
         self.dxgi_output_duplication = None
         self.d3d_device = None
-        self.width = None
-        self.height = None
+        self._width = None
+        self._height = None
+
+        # LastPresentTime / AccumulatedFrames of the last acquired frame
+        self.frame_information = None
+        self.performance_frequency = None
+
+        self._ready = Future()
+        threading.Thread(target=self._discover, name="display-discovery", daemon=True).start()
+
+    def ready(self):
+        return self._ready
+
+    @property
+    def width(self):
+        self._ready.result()
+        return self._width
+
+    @property
+    def height(self):
+        self._ready.result()
+        return self._height
+
+    def _discover(self):
+        try:
+            self._discover_outputs()
+        except BaseException as e:
+            self._ready.set_exception(e)
+        else:
+            self._ready.set_result(self)
+
+    def _discover_outputs(self):
+        dxgi = self.dxgi = _backend(".src.dxgi")
+        if dxgi is None:
+            raise OSError("desktop duplication API not available (Windows 8+ with comtypes)")
+
+        self.frame_information = dxgi.DXGI_OUTDUPL_FRAME_INFO()
+        self.performance_frequency = dxgi.get_performance_frequency()
 
         display_device_name_mapping = dxgi.get_display_device_name_mapping()
         dxgi_factory = dxgi.initialize_dxgi_factory()
@@ -123,56 +204,142 @@ class Display:
 
                     # Set resolutions
                     resolution = dxgi_output_description["resolution"]
-                    self.width = resolution[0]
-                    self.height = resolution[1]
+                    self._width = resolution[0]
+                    self._height = resolution[1]
 
                     self.d3d_device = dxgi.initialize_d3d_device(dxgi_adapter)[0]
                     self.dxgi_output_duplication = dxgi.initialize_dxgi_output_duplication(
                         dxgi_output, self.d3d_device)
 
-        print(self.primary, self.width, self.height, self.d3d_device)
+        print(self.primary, self._width, self._height, self.d3d_device)
 
-    def desktop_dup_api(self, resolution=None):
+    def desktop_dup_api(self, resolution=None, timeout=0, pool=None):
+        # timeout (ms) blocks until the desktop changes, None is returned when nothing changed
+        # pool: FramePool, the frame is copied into its reused buffer (valid until the next call)
+        # waits for the device discovery on the first call
         frame = None
 
+        self._ready.result()
         if not self.primary:
             return None
 
         if resolution is None:
-            resolution = (self.width, self.height)
+            resolution = (self._width, self._height)
 
         try:
-            frame = dxgi.get_dxgi_output_duplication_frame(
-                self.dxgi_output_duplication, self.d3d_device, height=resolution[1])
+            frame = self.dxgi.get_dxgi_output_duplication_frame(
+                self.dxgi_output_duplication, self.d3d_device, height=resolution[1], timeout=timeout,
+                frame_information=self.frame_information, buffer=pool.buffer if pool is not None else None)
         except Exception:
             pass
 
         return frame
 
+    @property
+    def last_present_time(self):
+        # present time of the last frame in seconds, same clock as time.perf_counter()
+        return self.frame_information.LastPresentTime / self.performance_frequency
+
+    @property
+    def accumulated_frames(self):
+        # desktop updates since the previously acquired frame
+        return self.frame_information.AccumulatedFrames
+
 
 class ScreenRecordDupAPI:
     # Desktop duplication API
-    def __init__(self, frame_buffer_size=180, region=None, memory=True):
+    def __init__(self, frame_buffer_size=180, region=None, memory=True, compress=False, index_size=None):
         # 180 frame roughly 10 second vedio with avg size of 8 Mb in memory
+        # compress: with memory=False keep the images compressed in memory (storage.FrameStore),
+        # decoded when popped
+        # index_size: last frames kept for frames_between() / nearest() / latest(), they stay referenced
+        # after being popped. Defaults to frame_buffer_size, 1 (latest only) with memory=False
+        # Returns before the display devices are discovered, see ready()
         self.display = Display()
-        self.width = self.display.width
-        self.height = self.display.height
         self.frame_buffer_size = frame_buffer_size
         self.frame_buffer = collections.deque(list(), self.frame_buffer_size)
+        if index_size is None:
+            index_size = frame_buffer_size if memory else 1  # a decoded 1080p image is ~6 MB
+        self.frame_index = FrameIndex(index_size)  # lookups by capture time, see frames_between()
         # Keep appending to deque, consumer will pop from left from the queue
         # Producer will keep appending vedio frames
         # When maximum length reached, the first(old vedio frames) will be automatically
         # be removed from the queue
         self.fps = 15
+        self.idle_fps = None  # adaptive rate, see capture()
+        self.idle_after = 30
         self.region = region  # region to be captured
         self.memory = memory  # if True, store frames in memory
+        self.store = FrameStore() if compress and not memory else None
+        self.encoder = PIL_JPEG
+        self.pool = FramePool()  # conversion buffers, used by the capture thread only
+        self.stripes = None
+        self._owns_stripes = False
+        self.dedup = None  # near duplicate / scene change filter, see capture()
+        self.rendition = None
+        self.frame_sequence = 0  # sequence number of the next FrameRecord
         self._is_capturing = False
+        self._stopped = threading.Event()  # stop flag of the current capture run, see stop()
+        self._thread = None  # capture thread of the current / last run
+        self._subscribers = list()  # frame callbacks, see subscribe()
 
-    def get_frame_buffer(self):
+    def ready(self):
+        # Future, done once the display is discovered (capture() can be called before)
+        return self.display.ready()
+
+    @property
+    def width(self):
+        return self.display.width  # waits for the display discovery
+
+    @property
+    def height(self):
+        return self.display.height
+
+    def get_frame_buffer(self, timestamp=False, array=False):
         # pop each frame, the first frame into the queue, will be the first one to be processed
         # Eg: sending over network etc ...
+        # timestamp=True returns (capture time, frame), time.perf_counter() clock
+        # compressed frames are decoded here, to a PIL image or with array=True to a numpy array
+        record = self.frame_buffer.popleft()
+        payload = record.payload
+        if isinstance(payload, CompressedFrame):
+            payload = payload.array() if array else payload.image()
+        return (record.timestamp, payload) if timestamp else payload
+
+    def get_frame_record(self):
+        # same as get_frame_buffer() but returns the FrameRecord (sequence, timing, rendition),
+        # a compressed payload is decoded with record.payload.image() / .array()
         return self.frame_buffer.popleft()
 
+    def frames_between(self, t1, t2):
+        # FrameRecords captured between t1 and t2 (perf_counter clock), oldest first, nothing is popped
+        return self.frame_index.frames_between(t1, t2)
+
+    def nearest(self, t):
+        return self.frame_index.nearest(t)
+
+    def latest(self):
+        return self.frame_index.latest()
+
+    def subscribe(self, callback):
+        # callback(record) is called on the capture thread with the FrameRecord of every buffered frame,
+        # it must return quickly (hand the frame over to another thread / event loop)
+        if callback not in self._subscribers:
+            self._subscribers = self._subscribers + [callback]  # copy on write, capture thread iterates
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers = [c for c in self._subscribers if c is not callback]
+
+    def _buffer(self, payload, frame_time, accumulated_frames=1, encode_time=0.0, scene_change=False):
+        record = FrameRecord(self.frame_sequence, frame_time, payload, accumulated_frames, encode_time,
+                             self.rendition, scene_change)
+        self.frame_sequence += 1
+        self.frame_buffer.appendleft(record)
+        self.frame_index.add(record)
+        for callback in self._subscribers:
+            callback(record)
+
     def screenshot(self):
         frame = None
         while frame is None:
@@ -181,43 +348,118 @@ class ScreenRecordDupAPI:
         frame = raw_to_memory(frame, self.width, self.height, memory=True, quality=30, hd="720p")
         return frame
 
-    def capture(self, fps=15, hd="1080p", quality=75):
+    def capture(self, fps=15, hd="1080p", quality=75, encoder=None, idle_fps=None, idle_after=30, stripes=None,
+                dedup=None):
         # runs on seperate thread, at any time only once you can launch capture
+        # encoder: None (PIL JPEG), encoder name or instance, "auto" picks the fastest installed backend
+        # idle_fps: adaptive rate, drop to idle_fps after idle_after frames without any desktop update,
+        # back to fps as soon as the desktop changes
+        # stripes: number of bands (or a StripedEncoder) to convert / encode each frame on several cores,
+        # lowers the per frame latency of 4K frames, only with memory=True
+        # dedup: True or a dedup.FrameFilter, frames nearly identical to the last encoded one are not
+        # encoded again (the previous payload is repeated), scene changes are flagged on the FrameRecord
         if self._is_capturing:
             return False
 
+        if not (isinstance(encoder, str) and encoder.startswith("auto")):
+            # resolved (and validated) here, only "auto" benchmarks at the display size and waits for it
+            encoder = get_encoder(encoder, quality=quality)
+            emit = "jpeg" if isinstance(stripes, int) else getattr(stripes, "emit", None)
+            if self.memory and emit == "jpeg" and encoder.format != "jpeg":
+                raise ValueError("only JPEG bands can be stitched, use emit='tiles'")
+
+        # a stopped run may still be finishing its frame, it shares pool, dedup and stripes
+        _join(self._thread)
+
+        self._owns_stripes = isinstance(stripes, int)  # closed again when the capture stops
+        self.stripes = StripedEncoder(bands=stripes) if self._owns_stripes else stripes
+        if dedup is True:
+            from .dedup import FrameFilter
+            dedup = FrameFilter()
+        self.dedup = dedup or None
+
         self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self._stopped = threading.Event()
         self._is_capturing = True
-        threading.Thread(target=self._capture, args=(hd, quality,)).start()
+        # "auto" needs the display size, it is resolved on the capture thread so that capture()
+        # does not wait for the display discovery
+        self._thread = threading.Thread(target=self._capture, args=(hd, quality, encoder, self._stopped))
+        self._thread.start()
         return True
 
-    def _capture(self, hd, quality):
+    def _capture(self, hd, quality, encoder, stopped):
+        # any error (display discovery, encoder) ends the capture, capture() can be called again.
+        # stopped is this run's flag, the cleanup only touches the state of this run
+        stripes = self.stripes if self._owns_stripes else None
+        try:
+            self._capture_frames(hd, quality, encoder, stopped)
+        finally:
+            if stripes is not None:
+                stripes.close()
+            if self._stopped is stopped:
+                self._owns_stripes = False
+                self._is_capturing = False
+
+    def _capture_frames(self, hd, quality, encoder, stopped):
+        self.ready().result()
+        width, height = self.width, self.height
+        self.encoder = get_encoder(encoder, *output_size(width, height, self.region, hd), quality=quality)
+        self.rendition = rendition_id(hd, quality, self.encoder, self.region)
+
         frame_time = 1 / self.fps
         region = self.region
         memory = self.memory
-
-        while self._is_capturing:
+        encoder = self.encoder
+        pool = self.pool
+        stripes = self.stripes
+        dedup = self.dedup
+        store = self.store
+        idle_frame_time = 1 / self.idle_fps if self.idle_fps else None
+        unchanged = 0  # frames without a desktop update
+
+        while not stopped.is_set():
             start = time()
 
-            frame = self.display.desktop_dup_api()
-
-            if frame is not None:
-                frame = raw_to_memory(frame, self.width, self.height,
-                                      region=region, hd=hd, quality=quality, memory=memory)
+            idle = idle_frame_time is not None and unchanged >= self.idle_after
+            if idle:
+                # wait inside AcquireNextFrame, any desktop update ends the wait at once
+                frame = self.display.desktop_dup_api(timeout=int(idle_frame_time * 1000), pool=pool)
+            else:
+                frame = self.display.desktop_dup_api(pool=pool)
+
+            emit, scene_change = frame is not None, False
+            if emit and dedup is not None:
+                emit, scene_change = dedup.check(dedup.signature_raw(frame, width, height, region))
+                emit = emit or not len(self.frame_buffer)  # nothing to repeat yet
+
+            if emit:
+                unchanged = 0
+                frame_time_stamp = self.display.last_present_time
+                encode_start = perf_counter()
+                frame = raw_to_memory(frame, width, height, region=region, hd=hd,
+                                      quality=quality, memory=memory, encoder=encoder, pool=pool, stripes=stripes)
+                if store is not None:
+                    frame = store.put(frame)  # compressed on the store's worker thread
                 print("Frame details ....")
-                self.frame_buffer.appendleft(frame)
+                self._buffer(frame, frame_time_stamp, self.display.accumulated_frames, perf_counter() - encode_start,
+                             scene_change)
             else:
+                unchanged += 1
                 if len(self.frame_buffer):
-                    self.frame_buffer.appendleft(self.frame_buffer[-1])
+                    # repeat the newest frame, stamped with the time it is repeated at
+                    self._buffer(self.frame_buffer[0].payload, perf_counter(), 0)
 
             now = time()
             # gc.collect()  # can be removed, check if any performance impact or not
 
-            frame_time_left = frame_time - (now - start)
+            if idle and frame is None:
+                frame_time_left = idle_frame_time - (now - start)
+            else:
+                frame_time_left = frame_time - (now - start)
             if frame_time_left > 0:
-                sleep(frame_time_left)
-
-        self._is_capturing = False
+                stopped.wait(frame_time_left)  # returns at once on stop()
 
     def stop(self):
         # call stop(), to stop previous recording. Now you can again start a new recording by calling
@@ -226,6 +468,7 @@ class ScreenRecordDupAPI:
             return False
 
         self._is_capturing = False
+        self._stopped.set()
         return True
 
     # def capture_a(self, target_fps=15):
@@ -267,45 +510,163 @@ class ScreenRecordDupAPI:
 
 
 class DirectScreenRecord:
-    # Direct X11 using ImageGrab
-    def __init__(self, frame_buffer_size=180, region=None, memory=True):
+    # Direct X11 using MIT-SHM (src/xshm.py), ImageGrab when shared memory capture is unavailable
+    def __init__(self, frame_buffer_size=180, region=None, memory=True, backend="auto", index_size=None):
+        # backend: "auto" (MIT-SHM if available), "xshm" (raise OSError if unavailable) or "imagegrab"
+        # index_size: see ScreenRecordDupAPI
         self.frame_buffer_size = frame_buffer_size
-        self.framebuffer = collections.deque(list(), self.frame_buffer_size)
-
-        self.width, self.height = ImageGrab.grab().size
+        self.frame_buffer = collections.deque(list(), self.frame_buffer_size)
+        if index_size is None:
+            index_size = frame_buffer_size if memory else 1  # a decoded 1080p image is ~6 MB
+        self.frame_index = FrameIndex(index_size)  # lookups by capture time, see frames_between()
+
+        self.x11 = None
+        if backend in ("auto", "xshm"):
+            try:
+                xshm = _backend(".src.xshm")
+                if xshm is None:
+                    raise OSError("MIT-SHM capture needs libX11 and libXext")
+                self.x11 = xshm.XShmCapture()
+            except OSError:
+                if backend == "xshm":
+                    raise
+
+        if self.x11 is not None:
+            self.width, self.height = self.x11.width, self.x11.height
+        else:
+            self.width, self.height = _backend("PIL.ImageGrab").grab().size
 
         self.fps = 15
+        self.idle_fps = None  # adaptive rate, see capture()
+        self.idle_after = 30
         self.region = region
         self.memory = memory  # store frames in memory
+        self.encoder = PIL_JPEG
+        self.pool = FramePool()  # conversion buffers, used by the capture thread only
+        self.dedup = None  # near duplicate / scene change filter, see capture()
+        self.rendition = None
+        self.frame_sequence = 0  # sequence number of the next FrameRecord
         self._is_capturing = False
+        self._thread = None  # capture thread of the current / last run
+        self._subscribers = list()  # frame callbacks, see subscribe()
 
-    def get_frame_buffer(self):
+    def get_frame_buffer(self, timestamp=False):
         # pop each frame, the first frame into the queue, will be the first one to be processed
         # Eg: sending over network etc ...
+        # timestamp=True returns (capture time, frame), time.perf_counter() clock
+        record = self.frame_buffer.popleft()
+        return (record.timestamp, record.payload) if timestamp else record.payload
+
+    def get_frame_record(self):
+        # same as get_frame_buffer() but returns the FrameRecord (sequence, timing, rendition)
         return self.frame_buffer.popleft()
 
-    def capture(self, fps=15, hd="1080p", quality=75):
+    def frames_between(self, t1, t2):
+        # FrameRecords captured between t1 and t2 (perf_counter clock), oldest first, nothing is popped
+        return self.frame_index.frames_between(t1, t2)
+
+    def nearest(self, t):
+        return self.frame_index.nearest(t)
+
+    def latest(self):
+        return self.frame_index.latest()
+
+    def subscribe(self, callback):
+        # callback(record) is called on the capture thread with the FrameRecord of every buffered frame,
+        # it must return quickly (hand the frame over to another thread / event loop)
+        if callback not in self._subscribers:
+            self._subscribers = self._subscribers + [callback]  # copy on write, capture thread iterates
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers = [c for c in self._subscribers if c is not callback]
+
+    def _buffer(self, payload, frame_time, accumulated_frames=1, encode_time=0.0, scene_change=False):
+        record = FrameRecord(self.frame_sequence, frame_time, payload, accumulated_frames, encode_time,
+                             self.rendition, scene_change)
+        self.frame_sequence += 1
+        self.frame_buffer.append(record)
+        self.frame_index.add(record)
+        for callback in self._subscribers:
+            callback(record)
+
+    def capture(self, fps=15, hd="1080p", quality=75, encoder=None, idle_fps=None, idle_after=30, dedup=None):
+        # idle_fps: adaptive rate, drop to idle_fps after idle_after unchanged frames (compared by a
+        # small downsampled signature), back to fps as soon as the screen changes
+        # dedup: True or a dedup.FrameFilter, near duplicate frames count as unchanged
         if self._is_capturing:
             return False
 
+        _join(self._thread)  # a stopped run may still be finishing its frame, it shares pool and dedup
+        if dedup is True:
+            from .dedup import FrameFilter
+            dedup = FrameFilter()
+        self.dedup = dedup or None
+
         self.fps = fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.encoder = get_encoder(encoder, *output_size(self.width, self.height, self.region, hd), quality=quality)
+        self.rendition = rendition_id(hd, quality, self.encoder, self.region)
         self._is_capturing = True
-        threading.Thread(target=self._capture, args=(hd, quality,)).start()
+        self._thread = threading.Thread(target=self._capture, args=(hd, quality,))
+        self._thread.start()
         return True
 
     def _capture(self, hd, quality):
         frame_time = 1 / self.fps
         region = self.region
+        encoder = self.encoder
+        pool = self.pool
+        dedup = self.dedup
+        idle_frame_time = 1 / self.idle_fps if self.idle_fps else None
+        x11 = self.x11
+        unchanged = 0  # frames with the same signature
+        signature = None
 
         while self._is_capturing:
             start = time()
-            image = ImageGrab.grab()
-            frame = pil_to_memory(image, self.width, self.height, region=region, hd=hd, quality=quality)
-            self.framebuffer.append(frame)
+            if x11 is not None:
+                # BGRX frame from the shared memory segment, same conversion path as the DXGI frames
+                image, raw = None, x11.grab(buffer=pool.buffer)
+                if raw is None:
+                    sleep(frame_time)
+                    continue
+            else:
+                image, raw = _backend("PIL.ImageGrab").grab(), None
+            frame_time_stamp = perf_counter()
+
+            scene_change = False
+            if dedup is not None:
+                if raw is not None:
+                    emit, scene_change = dedup.check(dedup.signature_raw(raw, self.width, self.height, region))
+                else:
+                    emit, scene_change = dedup.check(dedup.signature_image(image, region))
+                unchanged = 0 if emit else unchanged + 1
+            elif idle_frame_time is not None:
+                last_signature = signature
+                signature = raw_signature(raw) if raw is not None else frame_signature(image)
+                unchanged = unchanged + 1 if signature == last_signature else 0
+
+            if unchanged and len(self.frame_buffer):
+                # nothing changed, no need to encode again
+                self._buffer(self.frame_buffer[-1].payload, frame_time_stamp, 0)
+            else:
+                encode_start = perf_counter()
+                if raw is not None:
+                    frame = raw_to_memory(raw, self.width, self.height, region=region, hd=hd, quality=quality,
+                                          memory=True, encoder=encoder, pool=pool)  # encoded, like pil_to_memory
+                else:
+                    frame = pil_to_memory(image, self.width, self.height, region=region, hd=hd, quality=quality,
+                                          encoder=encoder, pool=pool)
+                self._buffer(frame, frame_time_stamp, 1, perf_counter() - encode_start, scene_change)
             print("-----------")
             now = time()
 
-            frame_time_left = frame_time - (now - start)
+            if idle_frame_time is not None and unchanged >= self.idle_after:
+                frame_time_left = idle_frame_time - (now - start)
+            else:
+                frame_time_left = frame_time - (now - start)
 
             if frame_time_left > 0:
                 sleep(frame_time_left)
@@ -323,11 +684,69 @@ class DirectScreenRecord:
 
 """
 API Use:
-rec = record.ScreenRecordDupAPI()
-rec.capture()
+rec = record.ScreenRecordDupAPI()  # returns at once, the display is discovered in the background
+rec.capture()  # starts as soon as the display is ready
+rec.ready().result()  # wait for the display, raises if there is none
 
 
-rec = record.DirectScreenRecord()
+rec = record.DirectScreenRecord()  # MIT-SHM shared memory capture on X11, ImageGrab otherwise
 rec.capture()
+rec = record.DirectScreenRecord(backend="imagegrab")
+
+
+Raw images compressed in memory (needs lz4, the zlib fallback is too slow for 1080p and leaves most frames
+uncompressed), decoded when popped:
+rec = record.ScreenRecordDupAPI(memory=False, compress=True)
+image = rec.get_frame_buffer()
+array = rec.get_frame_buffer(array=True)
+rec.store.stats()  # {"codec": "lz4", "compressed": n, "uncompressed": n, "pending": n}
+
+
+Encoder backends (PIL JPEG by default, "auto" benchmarks installed JPEG backends at startup):
+rec.capture(fps=15, hd="720p", quality=50, encoder="auto")
+rec.capture(encoder="webp")
+
+
+Adaptive rate, 2 fps after 30 frames without screen updates, full rate again on activity:
+rec.capture(fps=15, idle_fps=2, idle_after=30)
+capture_time, frame = rec.get_frame_buffer(timestamp=True)
+
+
+Frame records (sequence number, capture time, accumulated frames, encode time, rendition id):
+record = rec.get_frame_record()
+frame.latency_percentiles(sent_records)  # capture to send latency, {50: s, 90: s, 99: s}
+clip = rec.frames_between(t1, t2)  # indexed by capture time, does not pop from the buffer
+# the index keeps the last index_size frames (default frame_buffer_size, the latest only with memory=False)
+record = rec.nearest(t)
+record = rec.latest()
+
+
+Skip encoding near duplicate frames (caret blink, anti-aliasing flicker), flag scene changes:
+rec.capture(fps=15, dedup=dedup.FrameFilter(threshold=3.0, scene_threshold=40.0))
+record.scene_change  # True on the first frame after a scene change
+
+
+Striped encoding of 4K frames on 8 cores (bands stitched into one JPEG with restart markers):
+rec.capture(fps=15, stripes=8)
+
+
+Recording to disk (segment files with an offset index, written on a background thread):
+writer = sink.SegmentWriter("recordings", segment_bytes=256 * 2 ** 20, segment_seconds=60)
+writer.attach(rec)
+writer.close()
+entries = sink.read_index("recordings/capture-000000.idx")  # [(seq, timestamp, offset, length, flags)]
+
+
+Streaming to many viewers (MJPEG on http://127.0.0.1:8080/, WebSocket on the same path):
+server = stream.StreamServer(rec, port=8080)
+server.serve_forever()
+
+
+One capture feeding several consumers (each with its own region / resolution / quality / fps):
+capture_hub = hub.CaptureHub()
+preview = capture_hub.subscribe(hd="240p", quality=50, fps=5)
+window = capture_hub.subscribe(region=(0, 0, 1280, 720), hd="720p", fps=30)
+capture_hub.capture()
+server = stream.StreamServer({"preview": preview, "window": window})
 
 """
\ No newline at end of file
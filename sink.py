@@ -0,0 +1,203 @@
+import os
+import queue
+import struct
+import threading
+from time import perf_counter
+
+
+__all__ = ["SegmentWriter", "read_index", "read_frame"]
+
+
+# per frame index entry: seq, timestamp, offset in the segment, length, flags (1 = scene change)
+INDEX_ENTRY = struct.Struct("<QdQIB")
+SCENE_CHANGE = 1
+
+
+def read_index(path):
+    # [(seq, timestamp, offset, length, flags), ...] of a segment .idx file
+    with open(path, "rb") as file:
+        data = file.read()
+    size = len(data) - len(data) % INDEX_ENTRY.size  # ignore a torn last entry
+    return list(INDEX_ENTRY.iter_unpack(data[:size]))
+
+
+def read_frame(segment_path, offset, length):
+    with open(segment_path, "rb") as file:
+        file.seek(offset)
+        return file.read(length)
+
+
+class SegmentWriter:
+    # Recording sink: appends encoded frames into large segment files (<prefix>-<n>.seg) from a
+    # dedicated writer thread, every segment has a .idx next to it with one INDEX_ENTRY per frame
+    # for random access. Frames queued while a write is running are coalesced into one write.
+    # Segments rotate after segment_bytes or segment_seconds of capture time. Repeated frames
+    # (same payload object) only add an index entry pointing at the bytes already written.
+    # Backpressure: when `queue_size` frames are waiting the recorder's capture thread blocks for
+    # at most `max_wait` seconds, then the frame is dropped (counted in stats()).
+    # A write error (e.g. disk full) stops the writer thread: it is kept in `error`, later frames
+    # are dropped without blocking the capture thread and close() raises it.
+    #   writer = sink.SegmentWriter("recordings")
+    #   writer.attach(rec)
+    def __init__(self, directory, prefix="capture", segment_bytes=256 * 2 ** 20, segment_seconds=60,
+                 queue_size=64, max_wait=0.05, batch_bytes=4 * 2 ** 20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_wait = max_wait
+        self.batch_bytes = batch_bytes
+        self.segments = list()  # segment paths, oldest first
+        self.written = self.bytes = self.dropped = self.skipped = self.writes = 0
+        self.blocked_time = 0.0  # seconds the capture thread waited on a full queue
+        self.error = None  # exception that stopped the writer thread
+
+        self._queue = queue.Queue(queue_size)
+        self._recorders = list()
+        self._segment = self._index = None
+        self._segment_start = None
+        self._offset = 0
+        self._last = (None, 0)  # (payload, offset) of the last frame written to the segment
+        self._thread = threading.Thread(target=self._write, name="segment-writer", daemon=True)
+        self._thread.start()
+
+    def attach(self, recorder):
+        # write every frame the recorder buffers (recorder.subscribe)
+        recorder.subscribe(self.put)
+        self._recorders.append(recorder)
+
+    def detach(self, recorder):
+        recorder.unsubscribe(self.put)
+        self._recorders.remove(recorder)
+
+    def put(self, record):
+        # FrameRecord with an encoded payload, called on the capture thread
+        if not isinstance(record.payload, (bytes, bytearray, memoryview)):
+            self.skipped += 1  # raw images (memory=False) are not recorded
+            return False
+        if not self._thread.is_alive():
+            self.dropped += 1  # writer failed (see error) or closed
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+
+        start = perf_counter()
+        try:
+            self._queue.put(record, timeout=self.max_wait)
+            return self._thread.is_alive()
+        except queue.Full:
+            self.dropped += 1
+            return False
+        finally:
+            self.blocked_time += perf_counter() - start
+
+    def close(self):
+        # stop writing, frames already queued are written first. Raises the error that stopped
+        # the writer thread, if any
+        for recorder in list(self._recorders):
+            self.detach(recorder)
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass  # full queue, retry unless the writer died meanwhile
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        return {
+            "segments": len(self.segments),
+            "frames": self.written,
+            "bytes": self.bytes,
+            "writes": self.writes,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "queued": self._queue.qsize(),
+            "blocked_time": self.blocked_time,
+            "error": self.error,
+        }
+
+    def _open(self, timestamp):
+        self._close_segment()
+        path = os.path.join(self.directory, "%s-%06d.seg" % (self.prefix, len(self.segments)))
+        self._segment = open(path, "wb")
+        self._index = open(path[:-4] + ".idx", "wb")
+        self._segment_start = timestamp
+        self._offset = 0
+        self._last = (None, 0)
+        self.segments.append(path)
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+    def _rotate(self, record):
+        if self._segment is None:
+            return True
+        if self._offset and self._offset + len(record.payload) > self.segment_bytes:
+            return True
+        return record.timestamp - self._segment_start >= self.segment_seconds
+
+    def _write(self):
+        try:
+            self._write_batches()
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self._close_segment()
+            except OSError as e:
+                self.error = self.error or e
+
+    def _write_batches(self):
+        running = True
+        while running:
+            batch, size = list(), 0
+            record = self._queue.get()
+            while record is not None:
+                batch.append(record)
+                size += len(record.payload)
+                if size >= self.batch_bytes:
+                    break
+                try:
+                    record = self._queue.get_nowait()  # coalesce whatever queued up meanwhile
+                except queue.Empty:
+                    break
+            running = record is not None
+
+            payloads, entries = list(), list()
+            for record in batch:
+                if self._rotate(record):
+                    self._flush(payloads, entries)
+                    payloads, entries = list(), list()
+                    self._open(record.timestamp)
+                length = len(record.payload)
+                flags = SCENE_CHANGE if record.scene_change else 0
+                if record.payload is self._last[0]:
+                    # repeated frame (no desktop update), index the bytes already written
+                    entries.append(INDEX_ENTRY.pack(record.seq, record.timestamp, self._last[1], length, flags))
+                    continue
+                entries.append(INDEX_ENTRY.pack(record.seq, record.timestamp, self._offset, length, flags))
+                payloads.append(record.payload)
+                self._last = (record.payload, self._offset)
+                self._offset += length
+            self._flush(payloads, entries)
+
+    def _flush(self, payloads, entries):
+        if not entries:
+            return
+        self._segment.write(b"".join(payloads))
+        self._segment.flush()
+        self._index.write(b"".join(entries))  # after the data, an indexed frame is always complete
+        self._index.flush()
+        self.writes += 1
+        self.written += len(entries)
+        self.bytes += sum(len(payload) for payload in payloads)
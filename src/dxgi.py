@@ -374,12 +374,27 @@ def initialize_dxgi_output_duplication(dxgi_output, d3d_device):
     return dxgi_output_duplication
 
 
-def get_dxgi_output_duplication_frame(dxgi_output_duplication, d3d_device, height=0):
-    dxgi_output_duplication_frame_information = DXGI_OUTDUPL_FRAME_INFO()
+def get_performance_frequency():
+    # ticks per second of LastPresentTime (QueryPerformanceCounter), the same clock as time.perf_counter()
+    frequency = wintypes.LARGE_INTEGER()
+    ctypes.windll.kernel32.QueryPerformanceFrequency(ctypes.byref(frequency))
+
+    return frequency.value
+
+
+def get_dxgi_output_duplication_frame(dxgi_output_duplication, d3d_device, height=0, timeout=0,
+                                      frame_information=None, buffer=None):
+    # timeout: milliseconds to wait for a new desktop frame, raises COMError (DXGI_ERROR_WAIT_TIMEOUT) when none
+    # frame_information: optional DXGI_OUTDUPL_FRAME_INFO filled with LastPresentTime / AccumulatedFrames
+    # buffer: optional callable, buffer(size) returns a reused bytearray the frame is copied into
+    # instead of allocating new bytes every frame
+    if frame_information is None:
+        frame_information = DXGI_OUTDUPL_FRAME_INFO()
+    dxgi_output_duplication_frame_information = frame_information
     dxgi_resource = ctypes.POINTER(IDXGIResource)()
 
     dxgi_output_duplication.AcquireNextFrame(
-        0, ctypes.byref(dxgi_output_duplication_frame_information), ctypes.byref(dxgi_resource),
+        timeout, ctypes.byref(dxgi_output_duplication_frame_information), ctypes.byref(dxgi_resource),
     )
 
     frame = None
@@ -403,7 +418,11 @@ def get_dxgi_output_duplication_frame(dxgi_output_duplication, d3d_device, heigh
 
         size = pitch * height
 
-        frame = ctypes.string_at(pointer, size=size)
+        if buffer is None:
+            frame = ctypes.string_at(pointer, size=size)
+        else:
+            frame = buffer(size)
+            ctypes.memmove((ctypes.c_char * size).from_buffer(frame), pointer, size)
         id3d11_surface.Unmap()
 
     dxgi_output_duplication.ReleaseFrame()
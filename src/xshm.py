@@ -0,0 +1,215 @@
+import ctypes
+import ctypes.util
+
+
+# X11 screen capture through MIT-SHM: the X server writes the screen straight into a SysV shared
+# memory segment that is attached once, no image data goes through the X socket.
+
+Z_PIXMAP = 2
+ALL_PLANES = ctypes.c_ulong(-1).value
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class XImage(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+        ("obdata", ctypes.c_void_p),
+        ("funcs", ctypes.c_void_p * 6),
+    ]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+
+def _load(name):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise OSError("lib%s not found" % name)
+    return ctypes.CDLL(path)
+
+
+def _prototype(function, restype, *argtypes):
+    function.restype = restype
+    function.argtypes = argtypes
+    return function
+
+
+xlib = _load("X11")
+xext = _load("Xext")
+libc = ctypes.CDLL(None, use_errno=True)
+
+XOpenDisplay = _prototype(xlib.XOpenDisplay, ctypes.c_void_p, ctypes.c_char_p)
+XCloseDisplay = _prototype(xlib.XCloseDisplay, ctypes.c_int, ctypes.c_void_p)
+XDefaultScreen = _prototype(xlib.XDefaultScreen, ctypes.c_int, ctypes.c_void_p)
+XRootWindow = _prototype(xlib.XRootWindow, ctypes.c_ulong, ctypes.c_void_p, ctypes.c_int)
+XDisplayWidth = _prototype(xlib.XDisplayWidth, ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
+XDisplayHeight = _prototype(xlib.XDisplayHeight, ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
+XDefaultVisual = _prototype(xlib.XDefaultVisual, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int)
+XDefaultDepth = _prototype(xlib.XDefaultDepth, ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
+XSync = _prototype(xlib.XSync, ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
+XFree = _prototype(xlib.XFree, ctypes.c_int, ctypes.c_void_p)
+XSetErrorHandler = _prototype(xlib.XSetErrorHandler, ctypes.c_void_p, X_ERROR_HANDLER)
+
+XShmQueryExtension = _prototype(xext.XShmQueryExtension, ctypes.c_int, ctypes.c_void_p)
+XShmCreateImage = _prototype(xext.XShmCreateImage, ctypes.POINTER(XImage), ctypes.c_void_p, ctypes.c_void_p,
+                             ctypes.c_uint, ctypes.c_int, ctypes.c_char_p, ctypes.POINTER(XShmSegmentInfo),
+                             ctypes.c_uint, ctypes.c_uint)
+XShmAttach = _prototype(xext.XShmAttach, ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo))
+XShmDetach = _prototype(xext.XShmDetach, ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo))
+XShmGetImage = _prototype(xext.XShmGetImage, ctypes.c_int, ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                          ctypes.c_int, ctypes.c_int, ctypes.c_ulong)
+
+shmget = _prototype(libc.shmget, ctypes.c_int, ctypes.c_int, ctypes.c_size_t, ctypes.c_int)
+shmat = _prototype(libc.shmat, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
+shmdt = _prototype(libc.shmdt, ctypes.c_int, ctypes.c_void_p)
+shmctl = _prototype(libc.shmctl, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_void_p)
+
+
+class XShmCapture:
+    # One X display connection and one shared memory XImage, created once and reused for every
+    # grab(). Frames are 32 bit ZPixmap, on little endian TrueColor screens that is BGRX, the
+    # same layout as the DXGI frames, so they go through record.raw_to_memory unchanged.
+    # region captures only part of the screen (the segment is sized for it).
+    # Raises OSError when the display cannot be opened or MIT-SHM cannot be used (remote display,
+    # extension disabled, unsupported pixel format).
+    def __init__(self, display_name=None, region=None):
+        self.display = XOpenDisplay(display_name.encode() if display_name else None)
+        if not self.display:
+            raise OSError("cannot open X display %s" % (display_name or ""))
+
+        self.shminfo = XShmSegmentInfo()
+        self.image = None
+        self.attached = False
+        self._errors = list()
+        try:
+            self._create(region)
+        except OSError:
+            self.close()
+            raise
+
+    def _create(self, region):
+        display = self.display
+        if not XShmQueryExtension(display):
+            raise OSError("MIT-SHM extension not available")
+
+        screen = XDefaultScreen(display)
+        self.root = XRootWindow(display, screen)
+        self.screen_width, self.screen_height = XDisplayWidth(display, screen), XDisplayHeight(display, screen)
+        self.left, self.top, right, bottom = region or (0, 0, self.screen_width, self.screen_height)
+        self.width, self.height = right - self.left, bottom - self.top
+
+        image = XShmCreateImage(display, XDefaultVisual(display, screen), XDefaultDepth(display, screen), Z_PIXMAP,
+                                None, ctypes.byref(self.shminfo), self.width, self.height)
+        if not image:
+            raise OSError("XShmCreateImage failed")
+        self.image = image
+        if image.contents.bits_per_pixel != 32 or image.contents.byte_order != 0:  # LSBFirst
+            raise OSError("unsupported X image format, %d bpp" % image.contents.bits_per_pixel)
+
+        if image.contents.bytes_per_line != self.width * 4:
+            raise OSError("padded X image rows are not supported")
+        self.size = self.width * 4 * self.height
+        shminfo = self.shminfo
+        shminfo.shmid = shmget(IPC_PRIVATE, self.size, IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        shminfo.shmaddr = shmat(shminfo.shmid, None, 0)
+        if shminfo.shmaddr in (None, ctypes.c_void_p(-1).value):
+            shminfo.shmaddr = None
+            shmctl(shminfo.shmid, IPC_RMID, None)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        image.contents.data = shminfo.shmaddr
+        shminfo.readOnly = 0
+
+        # the default Xlib error handler exits the process, a failing attach (e.g. remote display)
+        # must only disable this backend
+        handler = X_ERROR_HANDLER(self._on_error)
+        previous = XSetErrorHandler(handler)
+        try:
+            attached = XShmAttach(display, ctypes.byref(shminfo))
+            XSync(display, 0)
+        finally:
+            XSetErrorHandler(X_ERROR_HANDLER(previous or 0))
+        # the segment is freed automatically once both sides detach
+        shmctl(shminfo.shmid, IPC_RMID, None)
+        if not attached or self._errors:
+            raise OSError("XShmAttach failed, X error code %s" % (self._errors[0] if self._errors else "?"))
+        self.attached = True
+
+    def _on_error(self, display, event):
+        self._errors.append(event.contents.error_code)
+        return 0
+
+    def grab(self, buffer=None):
+        # copy of the current screen (region) as BGRX bytes, buffer(size) -> bytearray reuses a buffer
+        # (see pool.FramePool.buffer) instead of allocating a new bytes object per frame
+        if not XShmGetImage(self.display, self.root, self.image, self.left, self.top, ALL_PLANES):
+            return None
+
+        address = self.shminfo.shmaddr
+        if buffer is None:
+            return ctypes.string_at(address, self.size)
+        frame = buffer(self.size)
+        ctypes.memmove((ctypes.c_char * self.size).from_buffer(frame), address, self.size)
+        return frame
+
+    def view(self):
+        # zero copy view of the shared segment, overwritten by the next grab()
+        return (ctypes.c_char * self.size).from_address(self.shminfo.shmaddr)
+
+    def close(self):
+        if self.display is None:
+            return
+        if self.attached:
+            XShmDetach(self.display, ctypes.byref(self.shminfo))
+            XSync(self.display, 0)
+            self.attached = False
+        if self.image:
+            self.image.contents.data = None  # shared memory, not owned by Xlib
+            XFree(self.image)
+            self.image = None
+        if self.shminfo.shmaddr:
+            shmdt(self.shminfo.shmaddr)
+            self.shminfo.shmaddr = None
+        XCloseDisplay(self.display)
+        self.display = None
+
+    def __del__(self):
+        self.close()
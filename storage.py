@@ -0,0 +1,130 @@
+import collections
+import queue
+import threading
+import zlib
+
+from PIL import Image
+
+from .encoder import _optional
+
+
+__all__ = ["CompressedFrame", "FrameStore"]
+
+
+def _compress(codec, data):
+    if codec == "lz4":
+        return codec, _optional("lz4.block").compress(data, store_size=False)
+    return codec, zlib.compress(data, 1)
+
+
+def _decompress(codec, data, size):
+    if codec == "lz4":
+        return _optional("lz4.block").decompress(data, uncompressed_size=size)
+    return zlib.decompress(data)
+
+
+class CompressedFrame:
+    # Raw (decoded) frame kept compressed in memory, payload of the buffered FrameRecord when the
+    # recorder stores images (memory=False) with a FrameStore. Holds the PIL image until the store's
+    # worker thread has compressed it, decoded again on image() / array().
+    __slots__ = ("store", "mode", "size", "_data")
+
+    def __init__(self, store, image):
+        self.store = store
+        self.mode = image.mode
+        self.size = image.size
+        self._data = (None, image)  # (codec, data), swapped in one assignment by the worker
+
+    @property
+    def compressed(self):
+        return self._data[0] is not None
+
+    def nbytes(self):
+        # memory held by the frame data
+        codec, data = self._data
+        return len(data) if codec else Image.getmodebands(self.mode) * self.size[0] * self.size[1]
+
+    def image(self):
+        return self.store.decode(self)
+
+    def array(self):
+        # numpy array (height, width, channels)
+        import numpy
+        return numpy.asarray(self.image())
+
+    def _compress(self):
+        codec, image = self._data
+        if codec is None:
+            self._data = _compress(self.store.codec, image.tobytes())
+
+
+class FrameStore:
+    # Compressed in-memory storage of raw frames. put() only wraps the image, compression
+    # (lz4 if installed, else zlib level 1) runs on a worker thread so the capture loop is never
+    # slowed down; when the worker falls behind by more than `backlog` frames the frame simply
+    # stays uncompressed (counted as `uncompressed`, see stats()). Decoding happens when a frame is
+    # read, the last `cache_size` decoded frames are kept in an LRU cache for repeated access.
+    # lz4 is effectively required: zlib level 1 takes ~200 ms for a 1080p frame, longer than a
+    # frame interval, so without lz4 most frames stay uncompressed.
+    def __init__(self, cache_size=4, backlog=32):
+        self.cache_size = cache_size
+        self.codec = "lz4" if _optional("lz4.block") is not None else "zlib"
+        self.compressed = 0  # frames compressed by the worker
+        self.uncompressed = 0  # frames kept uncompressed, the worker was `backlog` frames behind
+        self._pending = queue.Queue(backlog)
+        self._cache = collections.OrderedDict()  # CompressedFrame -> Image
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._compress, name="frame-store", daemon=True)
+        self._worker.start()
+
+    def put(self, image):
+        # image must not be modified afterwards (not a pooled image)
+        frame = CompressedFrame(self, image)
+        try:
+            self._pending.put_nowait(frame)
+        except queue.Full:
+            self.uncompressed += 1
+        return frame
+
+    def decode(self, frame):
+        codec, data = frame._data
+        if codec is None:
+            return data
+
+        with self._lock:
+            image = self._cache.get(frame)
+            if image is not None:
+                self._cache.move_to_end(frame)
+                return image
+
+        raw = _decompress(codec, data, Image.getmodebands(frame.mode) * frame.size[0] * frame.size[1])
+        image = Image.frombytes(frame.mode, frame.size, raw)
+        with self._lock:
+            self._cache[frame] = image
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return image
+
+    def stats(self):
+        return {
+            "codec": self.codec,
+            "compressed": self.compressed,
+            "uncompressed": self.uncompressed,
+            "pending": self._pending.qsize(),
+        }
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        # stop the worker, frames still pending stay uncompressed
+        self._pending.put(None)
+
+    def _compress(self):
+        while True:
+            frame = self._pending.get()
+            if frame is None:
+                return
+            frame._compress()
+            self.compressed += 1
@@ -0,0 +1,250 @@
+import asyncio
+import base64
+import collections
+import hashlib
+import struct
+from time import perf_counter
+
+from .frame import nearest_rank
+
+
+__all__ = ["StreamServer"]
+
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MJPEG_BOUNDARY = b"frame"
+
+
+def _mjpeg_header(frame, format="jpeg"):
+    # format: encoder format of the frame, "jpeg", "webp" or "png"
+    return b"--%s\r\nContent-Type: image/%s\r\nContent-Length: %d\r\n\r\n" % (
+        MJPEG_BOUNDARY, format.encode("ascii"), len(frame))
+
+
+def _ws_header(frame):
+    # single unmasked binary frame (server -> client)
+    size = len(frame)
+    if size < 126:
+        return struct.pack("!BB", 0x82, size)
+    if size < 65536:
+        return struct.pack("!BBH", 0x82, 126, size)
+    return struct.pack("!BBQ", 0x82, 127, size)
+
+
+class _Client:
+    def __init__(self, writer, queue_size, websocket):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.websocket = websocket
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, frame, drop):
+        # never waits, a slow client only loses its own frames
+        if self.closed:
+            return
+        if self.queue.full():
+            self.dropped += 1
+            if drop == "newest":
+                return
+            self.queue.get_nowait()  # drop oldest
+        self.queue.put_nowait(frame)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class StreamServer:
+    # Fan-out of encoded frames to many HTTP clients (MJPEG multipart and WebSocket).
+    # The server subscribes once to each recorder, every frame is encoded once by the
+    # recorder (one encode per rendition) and the same bytes object is shared by all clients.
+    # stats() reports capture to send latency percentiles from the FrameRecord timestamps.
+    # Each client has its own bounded queue, when it is full frames are dropped for that
+    # client only ("oldest" or "newest"), the capture thread is never blocked.
+    #
+    # sources: a recorder, or a dict {name: recorder} to serve several renditions,
+    # GET /<name> (or /<name>.mjpg) for MJPEG, the same path with a WebSocket upgrade for ws.
+    # Multipart parts are labelled with the recorder's encoder format (image/webp, image/png ...).
+    def __init__(self, sources, host="127.0.0.1", port=8080, queue_size=2, drop="oldest"):
+        if drop not in ("oldest", "newest"):
+            raise ValueError("drop must be 'oldest' or 'newest'")
+
+        if not isinstance(sources, dict):
+            sources = {"": sources}
+
+        self.sources = sources
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.drop = drop
+        self.clients = {name: set() for name in sources}
+        self._callbacks = dict()
+        self._handlers = set()
+        self.latencies = collections.deque(maxlen=4096)  # recent capture to send latencies (seconds)
+        self._loop = None
+        self._server = None
+
+    async def start(self):
+        for name, recorder in self.sources.items():
+            if not getattr(recorder, "memory", True):
+                raise ValueError("rendition %r does not store encoded frames (memory=False)" % name)
+
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+        for name, recorder in self.sources.items():
+            self._callbacks[name] = self._subscriber(name)
+            recorder.subscribe(self._callbacks[name])
+
+        return self
+
+    async def stop(self):
+        for name, callback in self._callbacks.items():
+            self.sources[name].unsubscribe(callback)
+        self._callbacks.clear()
+
+        self._server.close()
+        for clients in self.clients.values():
+            for client in list(clients):
+                client.close()
+        for handler in list(self._handlers):
+            handler.cancel()  # may be blocked on a client that stopped reading
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def serve_forever(self):
+        # blocking helper, run the server on its own event loop
+        async def main():
+            await self.start()
+            try:
+                await self._server.serve_forever()
+            finally:
+                await self.stop()
+
+        asyncio.run(main())
+
+    def stats(self):
+        stats = {
+            name: {
+                "clients": len(clients),
+                "sent": sum(c.sent for c in clients),
+                "dropped": sum(c.dropped for c in clients),
+            }
+            for name, clients in self.clients.items()
+        }
+        stats["latency"] = nearest_rank(sorted(self.latencies), (50, 90, 99))
+        return stats
+
+    def _subscriber(self, name):
+        loop = self._loop
+        broadcast = self._broadcast
+
+        def on_frame(record):
+            # capture thread, only a single hand over to the event loop per frame
+            if not isinstance(record.payload, (bytes, bytearray, memoryview)):
+                return
+            try:
+                loop.call_soon_threadsafe(broadcast, name, record)
+            except RuntimeError:
+                pass  # loop already closed
+
+        return on_frame
+
+    def _broadcast(self, name, record):
+        drop = self.drop
+        for client in self.clients[name]:
+            client.push(record, drop)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = request.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        headers = dict()
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        name = parts[1].strip("/") if len(parts) > 1 else ""
+        if name.endswith(".mjpg"):
+            name = name[:-5]
+
+        if len(parts) < 2 or parts[0] != "GET" or name not in self.sources:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await self._close(writer)
+            return
+
+        websocket = headers.get("upgrade", "").lower() == "websocket"
+        if websocket:
+            key = headers.get("sec-websocket-key", "").encode("latin-1")
+            accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+            writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        else:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=" + MJPEG_BOUNDARY +
+                         b"\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+
+        client = _Client(writer, self.queue_size, websocket)
+        self.clients[name].add(client)
+        self._handlers.add(asyncio.current_task())
+        watcher = asyncio.ensure_future(self._watch(reader, client))
+        source = self.sources[name]
+        latencies = self.latencies
+
+        try:
+            while True:
+                record = await client.queue.get()
+                if record is None:
+                    break
+
+                frame = record.payload
+                if websocket:
+                    writer.write(_ws_header(frame))
+                else:
+                    # read per frame, the recorder may have been restarted with another encoder
+                    writer.write(_mjpeg_header(frame, getattr(getattr(source, "encoder", None), "format", "jpeg")))
+                writer.write(frame)
+                if not websocket:
+                    writer.write(b"\r\n")
+                await writer.drain()
+                client.sent += 1
+                latencies.append(perf_counter() - record.timestamp)
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # client went away or server stopping
+        finally:
+            self.clients[name].discard(client)
+            self._handlers.discard(asyncio.current_task())
+            watcher.cancel()
+            await self._close(writer)
+
+    async def _watch(self, reader, client):
+        # detect disconnects, client data is ignored apart from a websocket close frame
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data or (client.websocket and data[0] & 0x0F == 0x8):
+                    break
+        except ConnectionError:
+            pass
+        client.close()
+
+    async def _close(self, writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -0,0 +1,118 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .encoder import PIL_JPEG, frame_pitch
+
+
+__all__ = ["StripedEncoder", "stitch_jpeg_bands"]
+
+
+MCU_ROWS = 16  # 4:2:0 MCU height, band heights are multiples of it so bands line up on MCU rows
+LANCZOS_SUPPORT = 3
+
+
+def _jpeg_segments(jpeg):
+    # split a baseline JPEG into (header up to and including SOS, entropy coded data, SOF offset, SOS offset)
+    pos, sof = 2, None
+    while True:
+        marker = jpeg[pos + 1]
+        length = int.from_bytes(jpeg[pos + 2:pos + 4], "big")
+        if marker == 0xC0:
+            sof = pos
+        elif marker == 0xDA:
+            break
+        elif marker in (0xC2, 0xDD):
+            raise ValueError("progressive JPEG or restart interval already set, cannot stitch")
+        pos += 2 + length
+
+    header_end = pos + 2 + length
+    return jpeg[:header_end], jpeg[header_end:jpeg.rindex(b"\xff\xd9")], sof, pos
+
+
+def stitch_jpeg_bands(bands, height, mcus_per_band):
+    # Join baseline JPEG bands of the same width, quality and tables into one JPEG with a
+    # restart marker between bands. Every band but the last must be mcus_per_band MCUs,
+    # each band's entropy data starts with reset DC predictors and ends byte aligned, which
+    # is exactly what a restart interval requires.
+    header, data, sof, sos = _jpeg_segments(bands[0])
+    header = bytearray(header)
+    header[sof + 5:sof + 7] = height.to_bytes(2, "big")  # SOF0: length(2) precision(1) height(2)
+    restart_interval = b"\xff\xdd\x00\x04" + mcus_per_band.to_bytes(2, "big")  # DRI
+
+    parts = [bytes(header[:sos]), restart_interval, bytes(header[sos:]), data]
+    for index, band in enumerate(bands[1:]):
+        parts.append(bytes((0xFF, 0xD0 + index % 8)))  # RSTn
+        parts.append(_jpeg_segments(band)[1])
+    parts.append(b"\xff\xd9")
+    return b"".join(parts)
+
+
+class StripedEncoder:
+    # Intra frame parallelism for large (4K) frames: the frame is split into horizontal bands,
+    # BGRA decode, crop, Lanczos downscale and JPEG encode run per band on a thread pool (PIL
+    # releases the GIL), then the bands are stitched into one JPEG with restart intervals
+    # (emit="jpeg") or returned as [(y, jpeg), ...] tiles (emit="tiles").
+    # Each band decodes enough extra source rows around it for the resampling filter, so the
+    # result matches resizing the whole frame.
+    def __init__(self, bands=None, workers=None, emit="jpeg"):
+        if emit not in ("jpeg", "tiles"):
+            raise ValueError("emit must be 'jpeg' or 'tiles'")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.bands = bands or self.workers
+        self.emit = emit
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="stripe")
+
+    def encode(self, raw_bytes, width, height, region=None, size=None, quality=75, encoder=None):
+        encoder = encoder or PIL_JPEG
+        if encoder.format != "jpeg" and self.emit == "jpeg":
+            raise ValueError("only JPEG bands can be stitched, use emit='tiles'")
+
+        left, top, right, bottom = region or (0, 0, width, height)
+        source_width, source_height = right - left, bottom - top
+        target_width, target_height = size or (source_width, source_height)
+
+        band_height = math.ceil(math.ceil(target_height / MCU_ROWS) / self.bands) * MCU_ROWS
+        if self.emit == "jpeg" and math.ceil(target_width / MCU_ROWS) * band_height // MCU_ROWS > 0xFFFF:
+            band_height = 0xFFFF // math.ceil(target_width / MCU_ROWS) * MCU_ROWS  # restart interval limit
+
+        raw = memoryview(raw_bytes)
+        futures = [
+            self.executor.submit(self._band, raw, width, height, (left, top, right, bottom), (target_width, target_height),
+                                 y, min(y + band_height, target_height), quality, encoder)
+            for y in range(0, target_height, band_height)
+        ]
+        bands = [future.result() for future in futures]
+
+        if self.emit == "tiles":
+            return [(y, band) for y, band in zip(range(0, target_height, band_height), bands)]
+        if len(bands) == 1:
+            return bands[0]
+        return stitch_jpeg_bands(bands, target_height, math.ceil(target_width / MCU_ROWS) * band_height // MCU_ROWS)
+
+    def _band(self, raw, width, height, region, size, y0, y1, quality, encoder):
+        left, top, right, bottom = region
+        scale = (bottom - top) / size[1]
+
+        # source rows of the band plus the resampling filter support
+        margin = math.ceil(LANCZOS_SUPPORT * max(scale, 1)) + 1
+        source_y0 = top + y0 * scale
+        source_y1 = top + y1 * scale
+        row0 = max(0, int(source_y0) - margin)
+        row1 = min(height, math.ceil(source_y1) + margin)
+
+        pitch = frame_pitch(raw, height)  # DXGI rows can be padded
+        image = Image.frombuffer("RGB", (width, row1 - row0), raw[row0 * pitch:row1 * pitch], "raw", "BGRX", pitch, 1)
+
+        box = (left, source_y0 - row0, right, source_y1 - row0)
+        if size == (right - left, bottom - top):
+            image = image.crop((left, int(box[1]), right, int(box[3])))
+        else:
+            image = image.resize((size[0], y1 - y0), Image.ANTIALIAS, box=box)
+        return encoder.encode(image, quality)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
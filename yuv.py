@@ -0,0 +1,114 @@
+import numpy
+from PIL import Image
+
+from .encoder import raw_to_array
+
+
+__all__ = ["bgra_to_yuv420", "yuv420_to_image", "reduce_factor", "psnr"]
+
+
+# BT.601 full range (JFIF) in 8 bit fixed point, each row sums to 256 (Y) or 0 (Cb, Cr)
+#                 B    G     R
+Y_COEFFICIENTS = (29, 150, 77)
+CB_COEFFICIENTS = (128, -85, -43)
+CR_COEFFICIENTS = (-21, -107, 128)
+
+
+def _block_sum(plane, factor, dtype):
+    # sum over factor x factor blocks with strided views (one pass over the plane, no
+    # reshape copy), remainder rows / columns are dropped
+    if factor == 1:
+        return plane.astype(dtype)
+
+    height, width = plane.shape[0] // factor * factor, plane.shape[1] // factor * factor
+    total = plane[0:height:factor, 0:width:factor].astype(dtype)
+    for i in range(factor):
+        for j in range(factor):
+            if i or j:
+                total += plane[i:height:factor, j:width:factor]
+    return total
+
+
+def _even(plane):
+    # replicate the last row / column of odd sized planes for 2x2 chroma blocks
+    if plane.shape[0] % 2 or plane.shape[1] % 2:
+        return numpy.pad(plane, ((0, plane.shape[0] % 2), (0, plane.shape[1] % 2)), mode="edge")
+    return plane
+
+
+def _combine(planes, coefficients, divisor, offset=0):
+    # weighted sum of B, G, R sums, rounded and divided back to 8 bit, clipped: a saturated primary
+    # gives exactly 256 for Cb / Cr, which would wrap to 0
+    b, g, r = planes
+    value = b * coefficients[0]
+    value += g * coefficients[1]
+    value += r * coefficients[2]
+    value += offset * divisor + divisor // 2
+    value //= divisor
+    numpy.clip(value, 0, 255, out=value)
+    return value.astype(numpy.uint8)
+
+
+def reduce_factor(frame_width, frame_height, size):
+    # integer box reduction fused into the conversion for a downscale from the frame to size.
+    # When a fractional scale is left only half of it is fused, the final Lanczos pass then still
+    # reduces by 2x or more and smooths the box filter edges (hard saturated edges lose ~3 dB otherwise)
+    if not size:
+        return 1
+    factor = max(1, min(frame_width // size[0], frame_height // size[1]))
+    if (frame_width // factor, frame_height // factor) != tuple(size):
+        factor = max(1, factor // 2)
+    return factor
+
+
+def bgra_to_yuv420(raw_bytes, width, height, size=None, region=None):
+    # Captured BGRA frame -> planar YUV 4:2:0 (Y, U, V uint8 arrays), without an RGB image.
+    # region crops the frame (a view, no copy). The integer part of the downscale is fused
+    # into the conversion (box filter, the colour transform is linear so summing first is
+    # exact), any remaining fractional scale resizes the much smaller planes.
+    frame = raw_to_array(raw_bytes, width, height)  # row padding skipped
+    if region:
+        frame = frame[region[1]:region[3], region[0]:region[2]]
+
+    frame_height, frame_width = frame.shape[:2]
+    target_width, target_height = size or (frame_width, frame_height)
+    factor = reduce_factor(frame_width, frame_height, size)
+
+    # per channel sums of factor x factor blocks, B, G, R are strided views into the frame
+    area = factor * factor
+    planes = [_block_sum(frame[:, :, c], factor, numpy.uint16 if area == 1 else numpy.int32) for c in range(3)]
+
+    y = _combine(planes, Y_COEFFICIENTS, 256 * area)
+    chroma = [_block_sum(_even(plane), 2, numpy.int32) for plane in planes]
+    u = _combine(chroma, CB_COEFFICIENTS, 256 * 4 * area, 128)
+    v = _combine(chroma, CR_COEFFICIENTS, 256 * 4 * area, 128)
+
+    if y.shape == (target_height, target_width):
+        return y, u, v
+
+    chroma_size = ((target_width + 1) // 2, (target_height + 1) // 2)
+    return (
+        numpy.asarray(Image.fromarray(y).resize((target_width, target_height), Image.ANTIALIAS)),
+        numpy.asarray(Image.fromarray(u).resize(chroma_size, Image.ANTIALIAS)),
+        numpy.asarray(Image.fromarray(v).resize(chroma_size, Image.ANTIALIAS)),
+    )
+
+
+def yuv420_to_image(y, u, v):
+    # planar YUV 4:2:0 -> PIL YCbCr image (chroma upsampled), for encoders without YUV input
+    size = (y.shape[1], y.shape[0])
+    return Image.merge("YCbCr", (
+        Image.fromarray(y),
+        Image.fromarray(u).resize(size, Image.BILINEAR),
+        Image.fromarray(v).resize(size, Image.BILINEAR),
+    ))
+
+
+def psnr(image_a, image_b):
+    # peak signal to noise ratio in dB between two images of the same size (compared as RGB)
+    a = numpy.asarray(image_a.convert("RGB"), numpy.float32)
+    b = numpy.asarray(image_b.convert("RGB"), numpy.float32)
+    mse = numpy.mean((a - b) ** 2)
+    if mse == 0:
+        return float("inf")
+    return float(10 * numpy.log10(255.0 ** 2 / mse))